@@ -1,5 +1,7 @@
 from scrivepy import _document, _exceptions, _field_placement, \
-     _field, _signatory, _scrive
+     _field, _signatory, _scrive, _async_scrive, _rate_limit, \
+     _retry, _metrics, _cache, _download, _attachment_registry, \
+     _callback, _poller, _fake
 
 
 TipSide = _field_placement.TipSide
@@ -23,8 +25,24 @@ DocumentStatus = _document.DocumentStatus
 Language = _document.Language
 DeletionStatus = _document.DeletionStatus
 AuthorAttachment = _document.AuthorAttachment
+FileAuthorAttachment = _document.FileAuthorAttachment
+MmapAuthorAttachment = _document.MmapAuthorAttachment
 Document = _document.Document
 Scrive = _scrive.Scrive
+AsyncScrive = _async_scrive.AsyncScrive
+RateLimiter = _rate_limit.RateLimiter
+RetryPolicy = _retry.RetryPolicy
+MetricsCollector = _metrics.MetricsCollector
+DocumentCache = _cache.DocumentCache
+DiskDocumentCache = _cache.DiskDocumentCache
+DownloadStatus = _download.DownloadStatus
+AttachmentRegistry = _attachment_registry.AttachmentRegistry
+CallbackReceiver = _callback.CallbackReceiver
+CallbackServer = _callback.CallbackServer
+DocumentPoller = _poller.DocumentPoller
+DocumentChange = _poller.DocumentChange
+FakeScrive = _fake.FakeScrive
+FakeScriveServer = _fake.FakeScriveServer
 
 __all__ = ['TipSide',
            'FieldPlacement',
@@ -47,5 +65,21 @@ __all__ = ['TipSide',
            'Language',
            'DeletionStatus',
            'AuthorAttachment',
+           'FileAuthorAttachment',
+           'MmapAuthorAttachment',
            'Document',
-           'Scrive']
+           'Scrive',
+           'AsyncScrive',
+           'RateLimiter',
+           'RetryPolicy',
+           'MetricsCollector',
+           'DocumentCache',
+           'DiskDocumentCache',
+           'DownloadStatus',
+           'AttachmentRegistry',
+           'CallbackReceiver',
+           'CallbackServer',
+           'DocumentPoller',
+           'DocumentChange',
+           'FakeScrive',
+           'FakeScriveServer']
@@ -0,0 +1,107 @@
+from multiprocessing import pool
+
+from requests import adapters
+
+from scrivepy import _scrive
+
+
+class AsyncScrive(object):
+    '''
+    Non-blocking counterpart of Scrive.
+
+    Every call is scheduled on a pool of max_workers threads sharing
+    one Scrive client (and its connection pool) and returns immediately
+    with an AsyncResult. Use its get() method to wait for the result.
+    Other keyword arguments (e.g. requests_per_second, max_in_flight
+    of the rate limiter) are passed to Scrive.
+    '''
+
+    def __init__(self, client_credentials_identifier,
+                 client_credentials_secret,
+                 token_credentials_identifier,
+                 token_credentials_secret,
+                 api_hostname=b'scrive.com', https=True,
+                 max_workers=adapters.DEFAULT_POOLSIZE, **kwargs):
+        kwargs.setdefault('pool_maxsize', max_workers)
+        self._scrive = _scrive.Scrive(client_credentials_identifier,
+                                      client_credentials_secret,
+                                      token_credentials_identifier,
+                                      token_credentials_secret,
+                                      api_hostname=api_hostname,
+                                      https=https, **kwargs)
+        self._pool = pool.ThreadPool(max_workers)
+
+    @property
+    def api_hostname(self):
+        return self._scrive.api_hostname
+
+    @property
+    def https(self):
+        return self._scrive.https
+
+    @property
+    def scrive(self):
+        '''
+        Blocking client used by the worker threads.
+        '''
+        return self._scrive
+
+    def close(self):
+        '''
+        Wait for all scheduled calls to finish and close the client.
+        '''
+        self._pool.close()
+        self._pool.join()
+        self._scrive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _submit(self, fun, *args):
+        return self._pool.apply_async(fun, args)
+
+    def create_document_from_file(self, file_path, file_name=None,
+                                  progress=None):
+        return self._submit(self._scrive.create_document_from_file,
+                            file_path, file_name, progress)
+
+    def change_document_file(self, document, file_path, file_name=None,
+                             progress=None):
+        return self._submit(self._scrive.change_document_file,
+                            document, file_path, file_name, progress)
+
+    def create_document_from_template(self, template_id):
+        return self._submit(self._scrive.create_document_from_template,
+                            template_id)
+
+    def get_document(self, document_id):
+        return self._submit(self._scrive.get_document, document_id)
+
+    def update_document(self, document):
+        return self._submit(self._scrive.update_document, document)
+
+    def send_document(self, file_path=None, template_id=None, prepare=None,
+                      timings=None):
+        return self._submit(self._scrive.send_document, file_path,
+                            template_id, prepare, timings)
+
+    def ready(self, document):
+        return self._submit(self._scrive.ready, document)
+
+    def trash_document(self, document):
+        return self._submit(self._scrive.trash_document, document)
+
+    def delete_document(self, document):
+        return self._submit(self._scrive.delete_document, document)
+
+    def get_file_bytes(self, file_):
+        return self._submit(file_.get_bytes)
+
+    def save_file_as(self, file_, file_path):
+        return self._submit(file_.save_as, file_path)
+
+    def save_file_to(self, file_, dir_path):
+        return self._submit(file_.save_to, dir_path)
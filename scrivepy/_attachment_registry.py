@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+
+
+class HashingReader(object):
+    '''
+    Wraps a stream and computes sha256 of the data read through it
+    (since the last seek, which starts the hash over).
+    '''
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._sha256 = hashlib.sha256()
+        self._complete = False
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._sha256.update(data)
+        if size is None or size < 0 or not data:
+            self._complete = True
+        return data
+
+    def tell(self):
+        return self._stream.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._stream.seek(offset, whence)
+        self._sha256 = hashlib.sha256()
+        self._complete = False
+
+    def hexdigest(self):
+        '''
+        Return hash of the content, None if it wasn't read to the end.
+        '''
+        if not self._complete:
+            return None
+        return self._sha256.hexdigest()
+
+    def close(self):
+        self._stream.close()
+
+
+class AttachmentRegistry(object):
+    '''
+    Maps content hashes (sha256) of uploaded author attachments to ids
+    of the files on the server, so that update_document can reference
+    identical content by id instead of uploading it again.
+
+    In-memory attachments are hashed directly. File backed attachments
+    are hashed while they're uploaded and recognized later by path,
+    inode, size and modification and change times, so they aren't read
+    just to be hashed. A file rewritten in place with the same size
+    within the timestamp resolution of the file system still looks
+    unchanged, such files should be passed as in-memory attachments.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_ids = {}
+        self._file_hashes = {}
+
+    def __len__(self):
+        return len(self._file_ids)
+
+    def get(self, content_hash):
+        with self._lock:
+            return self._file_ids.get(content_hash)
+
+    def put(self, content_hash, file_id):
+        with self._lock:
+            self._file_ids[content_hash] = file_id
+
+    def discard(self, content_hash):
+        with self._lock:
+            self._file_ids.pop(content_hash, None)
+
+    def _file_key(self, attachment):
+        try:
+            stat = os.stat(attachment.file_path)
+        except OSError:
+            return None
+        # ctime changes on every write, even if mtime is set back
+        return (attachment.file_path, stat.st_dev, stat.st_ino,
+                stat.st_size, stat.st_mtime, stat.st_ctime)
+
+    def content_hash(self, attachment):
+        '''
+        Return hash of attachment's content if it's known without
+        reading the attachment from disk, None otherwise.
+        '''
+        if attachment._content is not None:
+            return hashlib.sha256(attachment._content).hexdigest()
+        key = self._file_key(attachment)
+        with self._lock:
+            return self._file_hashes.get(key)
+
+    def _uploaded(self, attachment, content_hash, file_id, file_key=None):
+        # file_key was taken before the file was read, the file isn't
+        # recognized by it if it changed since
+        if file_key is not None and file_key == self._file_key(attachment):
+            with self._lock:
+                self._file_hashes[file_key] = content_hash
+        self.put(content_hash, file_id)
@@ -0,0 +1,294 @@
+import collections
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class CachedDocument(object):
+    '''
+    Raw JSON of a document fetched from the server.
+    '''
+
+    def __init__(self, document_id, content, etag=None, object_version=None,
+                 fetch_time=None):
+        if fetch_time is None:
+            fetch_time = time.time()
+        self.document_id = document_id
+        self.content = content
+        self.etag = etag
+        self.object_version = object_version
+        self.fetch_time = fetch_time
+
+    @property
+    def size(self):
+        return len(self.content)
+
+
+class BaseDocumentCache(object):
+    '''
+    Settings shared by the document caches used by Scrive. A cache is
+    any object with get, put, invalidate, clear and is_fresh methods
+    and a read_only property.
+
+    Entries older than ttl seconds are revalidated with the server
+    before use. Documents handed out from the cache are parsed anew
+    every time, so callers can't corrupt the cached state, and are
+    read-only unless read_only is False.
+    '''
+
+    def __init__(self, ttl=None, read_only=True):
+        self._ttl = ttl
+        self._read_only = read_only
+
+    @property
+    def read_only(self):
+        return self._read_only
+
+    def is_fresh(self, entry):
+        return self._ttl is None or time.time() - entry.fetch_time < self._ttl
+
+
+class DocumentCache(BaseDocumentCache):
+    '''
+    Bounded in-memory LRU cache of documents, keyed by document id.
+
+    Entries are evicted when there are more than max_entries of them or
+    they take more than max_bytes.
+    '''
+
+    def __init__(self, max_entries=1000, max_bytes=None, ttl=None,
+                 read_only=True):
+        if max_entries is not None and max_entries < 1:
+            raise ValueError(u'max_entries must be at least 1')
+        super(DocumentCache, self).__init__(ttl=ttl, read_only=read_only)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, document_id):
+        with self._lock:
+            entry = self._entries.pop(document_id, None)
+            if entry is not None:
+                # most recently used entries are at the end
+                self._entries[document_id] = entry
+            return entry
+
+    def put(self, entry):
+        if self._max_bytes is not None and entry.size > self._max_bytes:
+            self.invalidate(entry.document_id)
+            return
+        with self._lock:
+            self._remove(entry.document_id)
+            self._entries[entry.document_id] = entry
+            self._size += entry.size
+            while ((self._max_entries is not None and
+                    len(self._entries) > self._max_entries) or
+                   (self._max_bytes is not None and
+                    self._size > self._max_bytes)):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, document_id):
+        entry = self._entries.pop(document_id, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def invalidate(self, document_id):
+        with self._lock:
+            self._remove(document_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class DiskDocumentCache(BaseDocumentCache):
+    '''
+    Persistent document cache stored in an SQLite database.
+
+    It survives restarts, so cold starts are served from local disk
+    (and revalidated when older than ttl). Least recently used entries
+    are evicted when the cache takes more than max_bytes. The database
+    can be shared by many threads and processes on the same host.
+
+    Reads don't take the database's write lock: access times are
+    remembered in memory and saved with the next write of the same
+    cache object (or once there are flush_accesses of them), so
+    eviction order reflects other processes' reads with a delay.
+    '''
+
+    def __init__(self, file_path, max_bytes=None, ttl=None, read_only=True,
+                 timeout=30., flush_accesses=1000):
+        super(DiskDocumentCache, self).__init__(ttl=ttl, read_only=read_only)
+        self._file_path = os.path.abspath(file_path)
+        self._max_bytes = max_bytes
+        self._timeout = timeout
+        self._flush_accesses = flush_accesses
+        self._local = threading.local()
+        # access times not saved yet, by document id
+        self._accesses = {}
+        self._accesses_lock = threading.Lock()
+        with self._transaction() as conn:
+            conn.execute(u'''CREATE TABLE IF NOT EXISTS documents
+                            (document_id TEXT PRIMARY KEY,
+                             content BLOB NOT NULL,
+                             etag TEXT,
+                             object_version INTEGER,
+                             fetch_time REAL NOT NULL,
+                             access_time REAL NOT NULL,
+                             size INTEGER NOT NULL)''')
+            conn.execute(u'''CREATE INDEX IF NOT EXISTS access_time_index
+                            ON documents (access_time)''')
+            # running total of sizes, so it's never summed up
+            conn.execute(u'''CREATE TABLE IF NOT EXISTS total_size
+                            (id INTEGER PRIMARY KEY CHECK (id = 0),
+                             size INTEGER NOT NULL)''')
+            conn.execute(u'''INSERT OR IGNORE INTO total_size
+                            SELECT 0, COALESCE(SUM(size), 0)
+                            FROM documents''')
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    def _connection(self):
+        # sqlite connections can't be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._file_path, timeout=self._timeout,
+                                   isolation_level=None)
+            conn.execute(u'PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        # take the write lock upfront, to avoid deadlocks between
+        # processes upgrading read locks
+        conn.execute(u'BEGIN IMMEDIATE')
+        try:
+            self._save_accesses(conn)
+            yield conn
+        except Exception:
+            conn.execute(u'ROLLBACK')
+            raise
+        else:
+            conn.execute(u'COMMIT')
+
+    def _save_accesses(self, conn):
+        with self._accesses_lock:
+            accesses, self._accesses = self._accesses, {}
+        if not accesses:
+            return
+        conn.executemany(u'''UPDATE documents SET access_time = ?
+                            WHERE document_id = ?''',
+                         [(access_time, document_id) for document_id,
+                          access_time in accesses.items()])
+
+    def _add_size(self, conn, delta):
+        if delta:
+            conn.execute(u'UPDATE total_size SET size = size + ?', (delta,))
+
+    def _entry_size(self, conn, document_id):
+        row = conn.execute(u'SELECT size FROM documents WHERE document_id = ?',
+                           (document_id,)).fetchone()
+        return 0 if row is None else row[0]
+
+    @property
+    def size(self):
+        row = self._connection().execute(
+            u'SELECT size FROM total_size').fetchone()
+        return row[0]
+
+    def __len__(self):
+        row = self._connection().execute(
+            u'SELECT COUNT(*) FROM documents').fetchone()
+        return row[0]
+
+    def get(self, document_id):
+        row = self._connection().execute(
+            u'''SELECT content, etag, object_version, fetch_time
+               FROM documents WHERE document_id = ?''',
+            (document_id,)).fetchone()
+        if row is None:
+            return None
+        with self._accesses_lock:
+            self._accesses[document_id] = time.time()
+            flush = len(self._accesses) >= self._flush_accesses
+        if flush:
+            with self._transaction():
+                pass
+        content, etag, object_version, fetch_time = row
+        if etag is not None:
+            etag = etag.encode('utf-8')
+        return CachedDocument(document_id, bytes(content), etag=etag,
+                              object_version=object_version,
+                              fetch_time=fetch_time)
+
+    def put(self, entry):
+        if self._max_bytes is not None and entry.size > self._max_bytes:
+            self.invalidate(entry.document_id)
+            return
+        etag = entry.etag
+        if etag is not None:
+            etag = etag.decode('utf-8')
+        with self._transaction() as conn:
+            old_size = self._entry_size(conn, entry.document_id)
+            conn.execute(u'''INSERT OR REPLACE INTO documents
+                            (document_id, content, etag, object_version,
+                             fetch_time, access_time, size)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         (entry.document_id, buffer(entry.content), etag,
+                          entry.object_version, entry.fetch_time,
+                          time.time(), entry.size))
+            self._add_size(conn, entry.size - old_size)
+            if self._max_bytes is not None:
+                self._evict(conn)
+
+    def _evict(self, conn):
+        size = conn.execute(u'SELECT size FROM total_size').fetchone()[0]
+        if size <= self._max_bytes:
+            return
+        rows = conn.execute(u'''SELECT document_id, size FROM documents
+                               ORDER BY access_time''')
+        evicted = []
+        for document_id, entry_size in rows:
+            if size <= self._max_bytes:
+                break
+            evicted.append((document_id,))
+            size -= entry_size
+        conn.executemany(u'DELETE FROM documents WHERE document_id = ?',
+                         evicted)
+        conn.execute(u'UPDATE total_size SET size = ?', (size,))
+
+    def invalidate(self, document_id):
+        with self._transaction() as conn:
+            self._add_size(conn, -self._entry_size(conn, document_id))
+            conn.execute(u'DELETE FROM documents WHERE document_id = ?',
+                         (document_id,))
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute(u'DELETE FROM documents')
+            conn.execute(u'UPDATE total_size SET size = 0')
+
+    def close(self):
+        '''
+        Close database connection of the calling thread.
+        '''
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
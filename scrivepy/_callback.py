@@ -0,0 +1,198 @@
+import Queue
+import SocketServer
+import json
+import sys
+import threading
+import traceback
+import urlparse
+from wsgiref import simple_server
+
+from scrivepy import _document, _exceptions
+
+
+# callbacks carry the whole document json, which is rarely that big
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+_STOP = object()
+
+
+def parse_callback(body, content_type=b'', api=None):
+    '''
+    Return Document sent in the body of an api callback. Scrive posts
+    documentid and documentjson as a form, plain json bodies are
+    accepted as well. With api given, the document is bound to it,
+    as if it was fetched with api.get_document().
+    '''
+    if content_type.split(b';')[0].strip() == b'application/json':
+        document_json = body
+    else:
+        form = urlparse.parse_qs(body)
+        document_json = form.get(b'documentjson', [body])[0]
+    try:
+        json_obj = json.loads(document_json)
+    except ValueError as e:
+        raise _exceptions.InvalidResponse(e, body)
+    if api is not None:
+        return api._document_from_json(json_obj)
+    return _document.Document._from_json_obj(json_obj)
+
+
+class CallbackReceiver(object):
+    '''
+    WSGI application receiving Scrive api callbacks (see
+    Document.api_callback_url).
+
+    Received documents are put on a queue of at most queue_size
+    entries, handler is called with each of them by worker threads.
+    When the queue is full, callbacks are answered with 503, so that
+    Scrive delivers them again later, instead of piling up in memory.
+    Exceptions raised by handler are passed to error_handler (called
+    with the document and exc_info) or printed to stderr.
+    '''
+
+    def __init__(self, handler, api=None, queue_size=100, workers=1,
+                 error_handler=None, max_body_size=MAX_BODY_SIZE):
+        self._handler = handler
+        self._api = api
+        self._error_handler = error_handler
+        self._max_body_size = max_body_size
+        self._queue = Queue.Queue(queue_size)
+        self._threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def pending(self):
+        '''
+        Number of documents waiting for the handler.
+        '''
+        return self._queue.qsize()
+
+    def __call__(self, environ, start_response):
+        if environ[b'REQUEST_METHOD'] != b'POST':
+            return self._respond(start_response, b'405 Method Not Allowed',
+                                 [(b'Allow', b'POST')])
+        try:
+            length = int(environ.get(b'CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > self._max_body_size:
+            return self._respond(start_response, b'400 Bad Request')
+
+        body = environ[b'wsgi.input'].read(length)
+        try:
+            document = parse_callback(body,
+                                      environ.get(b'CONTENT_TYPE', b''),
+                                      self._api)
+        except Exception:
+            return self._respond(start_response, b'400 Bad Request')
+
+        try:
+            self._queue.put_nowait(document)
+        except Queue.Full:
+            return self._respond(start_response, b'503 Service Unavailable',
+                                 [(b'Retry-After', b'60')])
+        return self._respond(start_response, b'200 OK')
+
+    def _respond(self, start_response, status, headers=()):
+        start_response(status, [(b'Content-Type', b'text/plain'),
+                                (b'Content-Length', b'0')] + list(headers))
+        return []
+
+    def _work(self):
+        while True:
+            document = self._queue.get()
+            try:
+                if document is _STOP:
+                    return
+                try:
+                    self._handler(document)
+                except Exception:
+                    if self._error_handler is not None:
+                        self._error_handler(document, sys.exc_info())
+                    else:
+                        traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        '''
+        Wait until all received documents were handled.
+        '''
+        self._queue.join()
+
+    def close(self):
+        '''
+        Handle documents already received and stop the workers.
+        '''
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class _QuietHandler(simple_server.WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingWSGIServer(SocketServer.ThreadingMixIn,
+                           simple_server.WSGIServer):
+
+    daemon_threads = True
+
+
+class CallbackServer(object):
+    '''
+    Standalone HTTP server running a CallbackReceiver in a background
+    thread, for applications without a WSGI server of their own.
+    Port 0 picks a free port, see url.
+    '''
+
+    def __init__(self, receiver, host=b'', port=0):
+        self._receiver = receiver
+        self._server = simple_server.make_server(
+            host, port, receiver, server_class=_ThreadingWSGIServer,
+            handler_class=_QuietHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def receiver(self):
+        return self._receiver
+
+    @property
+    def server_address(self):
+        return self._server.server_address
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return b'http://%s:%d/' % (host, port)
+
+    def close(self):
+        '''
+        Stop accepting callbacks and close the receiver.
+        '''
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._receiver.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -1,3 +1,4 @@
+import mmap
 import os
 from cStringIO import StringIO
 from contextlib import closing
@@ -96,6 +97,70 @@ class AuthorAttachment(_file.File):
         self._merge = merge
 
 
+class FileAuthorAttachment(AuthorAttachment):
+    '''
+    Author attachment backed by a file, which is read only when the
+    attachment is streamed (e.g. uploaded by update_document), instead
+    of being held in memory. name defaults to the file's base name.
+    '''
+
+    @tvu(file_path=tvu.tvus.NonEmptyText,
+         name=tvu.nullable(tvu.tvus.NonEmptyText),
+         mandatory=tvu.instance(bool),
+         merge=tvu.instance(bool))
+    def __init__(self, file_path, name=None, mandatory=False, merge=True):
+        if name is None:
+            name = unicode(os.path.basename(file_path))
+        super(FileAuthorAttachment, self).__init__(name, b'',
+                                                   mandatory=mandatory,
+                                                   merge=merge)
+        self._content = None
+        self._file_path = file_path
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    def stream(self):
+        return open(self._file_path, 'rb')
+
+
+class _MmapStream(object):
+
+    def __init__(self, mapped):
+        self._mmap = mapped
+
+    def read(self, size=-1):
+        # mmap.read requires size
+        if size is None or size < 0:
+            size = len(self._mmap) - self._mmap.tell()
+        return self._mmap.read(size)
+
+    def tell(self):
+        return self._mmap.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._mmap.seek(offset, whence)
+
+    def close(self):
+        self._mmap.close()
+
+
+class MmapAuthorAttachment(FileAuthorAttachment):
+    '''
+    FileAuthorAttachment read through a read-only memory map, so the
+    content is paged in from the OS cache instead of copied by reads.
+    '''
+
+    def stream(self):
+        with open(self._file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # empty files can't be mapped
+                return StringIO(b'')
+            return _MmapStream(mmap.mmap(f.fileno(), 0,
+                                         access=mmap.ACCESS_READ))
+
+
 class RemoteAuthorAttachment(_file.RemoteFile):
 
     @tvu(id_=_object.ID,
@@ -172,6 +237,7 @@ class Document(_object.ScriveObject):
         self._deletion_status = DeletionStatus.not_deleted
         self._signing_possible = None
         self._object_version = None
+        self._etag = None
         self._timezone = u'Europe/Stockholm'
         self._viewed_by_author = None
         self._access_token = None
@@ -182,6 +248,8 @@ class Document(_object.ScriveObject):
         self._author_attachments = _set.ScriveSet()
         self._author_attachments._elem_validator = \
             tvu.instance(AuthorAttachment)
+        # author attachments as last saved on the server
+        self._saved_attachments = frozenset()
 
     @classmethod
     def _from_json_obj(cls, json):
@@ -243,6 +311,8 @@ class Document(_object.ScriveObject):
                                 for att_json in json[u'authorattachments']])
             author_attachments._elem_validator = tvu.instance(AuthorAttachment)
             document._author_attachments = author_attachments
+            document._saved_attachments = document._attachments_state()
+            document._set_clean()
 
             if document.status is not DocumentStatus.preparation:
                 document._set_read_only()
@@ -251,6 +321,17 @@ class Document(_object.ScriveObject):
         except (KeyError, TypeError, ValueError) as e:
             raise _exceptions.InvalidResponse(e, json)
 
+    def _attachments_state(self):
+        # local attachments always have to be uploaded
+        return frozenset(
+            (attachment.id, attachment.name, attachment.mandatory,
+             attachment.merge)
+            if isinstance(attachment, RemoteAuthorAttachment) else attachment
+            for attachment in self.author_attachments)
+
+    def _attachments_changed(self):
+        return self._attachments_state() != self._saved_attachments
+
     def _set_invalid(self):
         # invalidate subobjects first, before getter stops working
         self.signatories._set_invalid()
@@ -272,6 +353,26 @@ class Document(_object.ScriveObject):
         if self.sealed_document is not None:
             self.sealed_document._set_read_only()
 
+    def _is_dirty(self):
+        return (self._dirty or self._signatories._is_dirty() or
+                self._tags._is_dirty() or
+                self._author_attachments._is_dirty())
+
+    def _set_clean(self):
+        self._signatories._set_clean()
+        self._tags._set_clean()
+        self._author_attachments._set_clean()
+        super(Document, self)._set_clean()
+
+    def is_dirty(self):
+        '''
+        Return True if the document (or any of its signatories, fields,
+        placements, tags or attachments) was modified since it was
+        fetched from the server.
+        '''
+        self._check_getter()
+        return self._is_dirty()
+
     def _to_json_obj(self):
         return {u'title': self.title,
                 u'daystosign': self.number_of_days_to_sign,
@@ -0,0 +1,264 @@
+import contextlib
+import enum
+import errno
+import httplib
+import os
+import re
+import socket
+import time
+import uuid
+from multiprocessing import pool
+
+import requests
+from requests.packages.urllib3 import exceptions as urllib3_exceptions
+
+from scrivepy import _exceptions
+
+
+CHUNK_SIZE = 64 * 1024
+# files at least that big are downloaded as parallel ranges
+PARALLEL_THRESHOLD = 8 * 1024 * 1024
+
+_READ_ERRORS = (requests.RequestException, urllib3_exceptions.HTTPError,
+                httplib.HTTPException, socket.error)
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-\d+/(\d+|\*)$')
+
+
+class DownloadStatus(unicode, enum.Enum):
+    downloaded = u'downloaded'
+    skipped = u'skipped'  # already present with the same size
+    missing = u'missing'  # document has no such file
+    failed = u'failed'
+
+
+def remote_size(api, url_elems):
+    '''
+    Return size of the file (from a HEAD request) or None if unknown.
+    '''
+    response = api._make_request(url_elems, method=b'HEAD',
+                                 headers={'Accept-Encoding': 'identity'})
+    length = response.headers.get('Content-Length')
+    return None if length is None else int(length)
+
+
+class RangeStream(object):
+    '''
+    File-like object reading bytes start..end (end excluded, None means
+    until the end of the file) of a download. If the connection fails
+    or is closed early, reading resumes where it stopped with a Range
+    request. Resuming is retried according to the api's retry policy,
+    attempts are counted from the last successful read.
+    '''
+
+    def __init__(self, api, url_elems, start=0, end=None):
+        self._api = api
+        self._url_elems = url_elems
+        self._position = start
+        self._end = end
+        self._response = None
+        self._attempt = 0
+        # size of the whole file, None if unknown
+        self.size = None
+        self._open()
+
+    def _open(self):
+        # ranges apply to the encoded content, so it's not compressed
+        headers = {'Accept-Encoding': 'identity'}
+        if self._position or self._end is not None:
+            last = b'' if self._end is None else b'%d' % (self._end - 1,)
+            headers['Range'] = b'bytes=%d-%s' % (self._position, last)
+        response = self._api._make_request(self._url_elems, method=b'GET',
+                                           stream=True, headers=headers)
+        try:
+            if response.status_code == 206:
+                match = _CONTENT_RANGE.match(
+                    response.headers.get('Content-Range', ''))
+                if match is None or int(match.group(1)) != self._position:
+                    raise _exceptions.InvalidResponse(
+                        u'bad Content-Range', response.headers)
+                if match.group(2) != b'*':
+                    self.size = int(match.group(2))
+            else:
+                # server ignored the range, skip what was already read
+                length = response.headers.get('Content-Length')
+                if length is not None:
+                    self.size = int(length)
+                to_skip = self._position
+                while to_skip:
+                    data = response.raw.read(min(to_skip, CHUNK_SIZE))
+                    if not data:
+                        raise _exceptions.Error(u'Download interrupted')
+                    to_skip -= len(data)
+        except Exception:
+            response.close()
+            raise
+        if self._end is None:
+            self._end = self.size
+        self._response = response
+
+    def _resume(self, error):
+        self.close()
+        policy = self._api.retry_policy
+        if self._attempt >= policy.max_retries:
+            raise error
+        time.sleep(policy.backoff(self._attempt))
+        self._attempt += 1
+
+    @property
+    def position(self):
+        return self._position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(CHUNK_SIZE), b''))
+        return self._read(size, lambda raw, size: raw.read(size), b'')
+
+    def readinto(self, buffer_):
+        view = memoryview(buffer_)
+        return self._read(len(view),
+                          lambda raw, size: raw.readinto(view[:size]), 0)
+
+    def _read(self, size, read, eof):
+        # read(raw, size) returns data read or its length
+        if self._end is not None:
+            size = min(size, self._end - self._position)
+            if size <= 0:
+                return eof
+
+        while True:
+            error = None
+            try:
+                if self._response is None:
+                    self._open()
+                result = read(self._response.raw, size)
+            except requests.HTTPError:
+                # error statuses were already retried by the api
+                raise
+            except _READ_ERRORS as e:
+                error = e
+            else:
+                length = result if isinstance(result, int) else len(result)
+                if length:
+                    self._position += length
+                    # retries are counted since the last progress
+                    self._attempt = 0
+                    return result
+                if self._end is None or self._position >= self._end:
+                    return eof
+                error = _exceptions.Error(u'Download interrupted at byte %d'
+                                          % (self._position,))
+            self._resume(error)
+
+    def close(self):
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+
+def copy(stream, file_obj, block_size=CHUNK_SIZE, fsync=False):
+    '''
+    Copy stream to file_obj through one preallocated buffer of
+    block_size bytes (readinto is used if stream supports it). With
+    fsync, file_obj is flushed to disk afterwards.
+    '''
+    with contextlib.closing(stream):
+        if hasattr(stream, 'readinto'):
+            view = memoryview(bytearray(block_size))
+            while True:
+                length = stream.readinto(view)
+                if not length:
+                    break
+                file_obj.write(view[:length])
+        else:
+            while True:
+                data = stream.read(block_size)
+                if not data:
+                    break
+                file_obj.write(data)
+    if fsync:
+        file_obj.flush()
+        os.fsync(file_obj.fileno())
+
+
+def _copy_range(stream, file_path, start, block_size, fsync):
+    with open(file_path, 'r+b') as f:
+        f.seek(start)
+        copy(stream, f, block_size, fsync)
+    return stream.position - start
+
+
+def _download_range(api, url_elems, file_path, start, end, block_size,
+                    fsync):
+    stream = RangeStream(api, url_elems, start=start, end=end)
+    return _copy_range(stream, file_path, start, block_size, fsync)
+
+
+def _create_temp_file(dir_path, file_name):
+    # unlike mkstemp, the permissions follow the umask as for any new
+    # file (mode 0666 is masked by the kernel)
+    while True:
+        temp_path = os.path.join(dir_path, '.%s%s.part'
+                                 % (file_name, uuid.uuid4().hex[:8]))
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o666)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                continue
+            raise
+        return fd, temp_path
+
+
+def save_as(api, url_elems, file_path, max_workers=1,
+            parallel_threshold=PARALLEL_THRESHOLD, block_size=CHUNK_SIZE,
+            fsync=False):
+    '''
+    Download to file_path atomically: the content is written to a
+    temporary file next to it, which is renamed only after its length
+    was verified (and it was fsynced, if fsync is True). Files of at
+    least parallel_threshold bytes are fetched as max_workers ranges
+    in parallel. The file gets the permissions of a newly created one.
+    '''
+    dir_path, file_name = os.path.split(os.path.abspath(file_path))
+    fd, temp_path = _create_temp_file(dir_path, file_name)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            stream = RangeStream(api, url_elems)
+            size = stream.size
+            if (max_workers > 1 and size is not None and
+                    size >= parallel_threshold):
+                f.truncate(size)
+                f.flush()
+                range_size = -(-size // max_workers)
+                stream._end = range_size
+
+                def fetch(start):
+                    if start == 0:
+                        # read from the response already open
+                        return _copy_range(stream, temp_path, start,
+                                           block_size, fsync)
+                    return _download_range(
+                        api, url_elems, temp_path, start,
+                        min(start + range_size, size), block_size, fsync)
+
+                workers = pool.ThreadPool(max_workers)
+                try:
+                    written = sum(workers.map(fetch,
+                                              range(0, size, range_size)))
+                    workers.close()
+                finally:
+                    workers.terminate()
+                    workers.join()
+            else:
+                copy(stream, f, block_size, fsync)
+                written = stream.position
+        if size is not None and written != size:
+            raise _exceptions.Error(u'Downloaded %d bytes instead of %d'
+                                    % (written, size))
+        os.rename(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,759 @@
+import BaseHTTPServer
+import SocketServer
+import cgi
+import copy
+import datetime
+import httplib
+import io
+import itertools
+import json
+import os
+import re
+import socket
+import threading
+import time
+import urlparse
+import zlib
+
+from dateutil import parser as dateparser, tz
+from requests import adapters, models, structures, utils
+from requests.packages.urllib3 import response as urllib3_response
+
+from scrivepy import _scrive
+
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _HTTPError(Exception):
+
+    def __init__(self, status, message=u''):
+        super(_HTTPError, self).__init__(message)
+        self.status = status
+
+
+def _iso_time(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.datetime.utcfromtimestamp(timestamp).strftime(
+        u'%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_time(time_string):
+    datetime_ = dateparser.parse(time_string)
+    if datetime_.tzinfo is not None:
+        datetime_ = datetime_.astimezone(tz.tzutc()).replace(tzinfo=None)
+    epoch = datetime.datetime(1970, 1, 1)
+    return (datetime_ - epoch).total_seconds()
+
+
+def _file_title(file_json):
+    # documents are titled after their main file
+    return os.path.splitext(file_json[u'name'])[0]
+
+
+def _parse_form(headers, body):
+    '''
+    Return (fields, files) of a urlencoded or multipart request body,
+    files map field names to (file name, content) tuples.
+    '''
+    if headers.get('content-encoding', '').lower() == 'gzip':
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    content_type = headers.get('content-type', '')
+    fields = {}
+    files = {}
+    if content_type.startswith('multipart/form-data'):
+        form = cgi.FieldStorage(
+            fp=io.BytesIO(body),
+            environ={'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type,
+                     'CONTENT_LENGTH': str(len(body))},
+            keep_blank_values=True)
+        for key in form.keys():
+            item = form[key]
+            file_name = item.filename
+            if file_name is None and 'filename*' in item.disposition_options:
+                # RFC 2231 encoded non-ascii name
+                _, _, quoted = \
+                    item.disposition_options['filename*'].partition("''")
+                file_name = urlparse.unquote(quoted)
+            if file_name is not None:
+                files[key] = (file_name.decode('utf-8'), item.value)
+            else:
+                fields[key] = item.value
+    else:
+        for key, val in urlparse.parse_qsl(body, keep_blank_values=True):
+            fields[key] = val
+    return fields, files
+
+
+def _signatory_json(**kwargs):
+    '''
+    Return JSON of a signatory as sent by the server, kwargs override
+    the defaults.
+    '''
+    result = {u'id': None,
+              u'current': False,
+              u'signorder': 1,
+              u'undeliveredInvitation': False,
+              u'undeliveredMailInvitation': False,
+              u'undeliveredSMSInvitation': False,
+              u'deliveredInvitation': False,
+              u'delivery': u'email',
+              u'confirmationdelivery': u'email',
+              u'authentication': u'standard',
+              u'signs': True,
+              u'author': False,
+              u'allowshighlighting': False,
+              u'saved': False,
+              u'datamismatch': None,
+              u'signdate': None,
+              u'seendate': None,
+              u'readdate': None,
+              u'rejecteddate': None,
+              u'rejectionreason': None,
+              u'signsuccessredirect': None,
+              u'rejectredirect': None,
+              u'signlink': None,
+              u'attachments': [],
+              u'fields': []}
+    result.update(kwargs)
+    return result
+
+
+def _document_json(**kwargs):
+    '''
+    Return JSON of a document as sent by the server, kwargs override
+    the defaults.
+    '''
+    result = {u'id': None,
+              u'title': u'New document',
+              u'daystosign': 90,
+              u'daystoremind': None,
+              u'status': u'Preparation',
+              u'time': None,
+              u'ctime': None,
+              u'timeouttime': None,
+              u'autoremindtime': None,
+              u'signorder': 1,
+              u'template': False,
+              u'showheader': True,
+              u'showpdfdownload': True,
+              u'showrejectoption': True,
+              u'allowrejectreason': True,
+              u'showfooter': True,
+              u'invitationmessage': u'',
+              u'confirmationmessage': u'',
+              u'apicallbackurl': None,
+              u'lang': u'sv',
+              u'tags': [],
+              u'saved': False,
+              u'deleted': False,
+              u'reallydeleted': False,
+              u'canperformsigning': False,
+              u'objectversion': 1,
+              u'timezone': u'Europe/Stockholm',
+              u'isviewedbyauthor': True,
+              u'accesstoken': None,
+              u'file': None,
+              u'sealedfile': None,
+              u'authorattachments': [],
+              u'signatories': []}
+    result.update(kwargs)
+    return result
+
+
+class FakeScrive(object):
+    '''
+    In-memory stand-in for the v1 Scrive API endpoints used by Scrive,
+    for benchmarks, load tests and offline development. State is kept
+    per instance and nothing is ever sent over the network when using
+    api() (see FakeScriveServer for a local HTTP server).
+
+    Documents are created, updated, made ready, signed, canceled,
+    trashed, deleted, listed and their files downloaded (with Range
+    support) roughly as by the real server. Signing of the last
+    signing party closes the document, its main file is used as the
+    sealed one from the next request on. Times come from clock, so runs
+    can be made deterministic.
+    '''
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._documents = {}
+        self._files = {}
+        self.request_count = 0
+
+    def _new_id(self):
+        return unicode(next(self._ids))
+
+    def transport(self):
+        '''
+        Return requests transport adapter sending requests to this fake.
+        '''
+        return FakeTransport(self)
+
+    def api(self, **kwargs):
+        '''
+        Return Scrive client talking to this fake in-process.
+        '''
+        kwargs.setdefault('api_hostname', b'fake.scrive.com')
+        return _scrive.Scrive(b'client', b'secret', b'token', b'secret',
+                              transport=self.transport(), **kwargs)
+
+    def add_file(self, content, name=u'document.pdf'):
+        '''
+        Store file and return its id, e.g. for attachments by file id.
+        '''
+        with self._lock:
+            file_id = self._new_id()
+            self._files[file_id] = (name, content)
+            return file_id
+
+    def document_json(self, document_id):
+        '''
+        Return JSON of document as sent by the server (a copy).
+        '''
+        with self._lock:
+            return copy.deepcopy(self._document(document_id))
+
+    def handle(self, method, path, headers, body):
+        '''
+        Handle one request, return (status, headers, body).
+        headers must have lower case keys.
+        '''
+        url = urlparse.urlparse(path)
+        elems = [urlparse.unquote(elem).decode('utf-8')
+                 for elem in url.path.split('/api/v1/', 1)[-1].split('/')]
+        query = dict(urlparse.parse_qsl(url.query))
+        handler = getattr(self, '_on_' + elems[0], None)
+        with self._lock:
+            self.request_count += 1
+            try:
+                if not elems[0] or handler is None:
+                    raise _HTTPError(404, u'Unknown endpoint')
+                if not headers.get('authorization'):
+                    raise _HTTPError(403, u'Missing credentials')
+                return handler(method, elems[1:], query, headers, body)
+            except _HTTPError as e:
+                return (e.status, {'Content-Type': 'text/plain'},
+                        unicode(e).encode('utf-8'))
+
+    def _respond_document(self, document):
+        return (200, {'Content-Type': 'application/json; charset=utf-8',
+                      'ETag': b'"%d"' % (document[u'objectversion'],)},
+                json.dumps(document))
+
+    def _document(self, document_id):
+        # really deleted documents are still returned, marked as such
+        document = self._documents.get(document_id)
+        if document is None:
+            raise _HTTPError(404, u'No such document')
+        if (document[u'status'] == u'Closed' and
+                document[u'sealedfile'] is None):
+            # sealing is done by the time of the next request
+            document[u'sealedfile'] = document[u'file']
+            self._touch(document)
+        return document
+
+    def _touch(self, document):
+        document[u'objectversion'] += 1
+        document[u'time'] = _iso_time(self._clock())
+
+    def _expect(self, method, expected):
+        if method != expected:
+            raise _HTTPError(405, u'Method not allowed')
+
+    def _expect_status(self, document, *statuses):
+        if document[u'status'] not in statuses:
+            raise _HTTPError(409, u'Document is %s' % (document[u'status'],))
+
+    def _signatory(self, author, **kwargs):
+        return _signatory_json(id=self._new_id(), author=author, **kwargs)
+
+    def _new_document(self, main_file):
+        now = _iso_time(self._clock())
+        title = u'New document'
+        if main_file is not None:
+            title = _file_title(main_file)
+        document = _document_json(
+            id=self._new_id(), title=title, time=now, ctime=now,
+            accesstoken=self._new_id(), file=main_file,
+            signatories=[self._signatory(True, current=True)])
+        self._documents[document[u'id']] = document
+        return document
+
+    def _store_upload(self, headers, body):
+        _, files = _parse_form(headers, body)
+        if u'file' not in files:
+            return None
+        name, content = files[u'file']
+        file_id = self._new_id()
+        self._files[file_id] = (name, content)
+        return {u'id': file_id, u'name': name}
+
+    def _on_createfromfile(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._new_document(self._store_upload(headers, body))
+        return self._respond_document(document)
+
+    def _on_createfromtemplate(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        template = self._document(args[0])
+        if not template[u'template']:
+            raise _HTTPError(409, u'Not a template')
+        document = copy.deepcopy(template)
+        new_document = self._new_document(template[u'file'])
+        for key in (u'id', u'time', u'ctime', u'accesstoken'):
+            document[key] = new_document[key]
+        # the copy keeps the template's objectversion, as on the server
+        document[u'template'] = False
+        for signatory in document[u'signatories']:
+            signatory[u'id'] = self._new_id()
+        self._documents[document[u'id']] = document
+        return self._respond_document(document)
+
+    def _on_changemainfile(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Preparation')
+        document[u'file'] = self._store_upload(headers, body)
+        if document[u'file'] is not None:
+            document[u'title'] = _file_title(document[u'file'])
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_get(self, method, args, query, headers, body):
+        self._expect(method, 'GET')
+        document = self._document(args[0])
+        etag = b'"%d"' % (document[u'objectversion'],)
+        if headers.get('if-none-match') == etag:
+            return 304, {'ETag': etag}, b''
+        return self._respond_document(document)
+
+    def _on_list(self, method, args, query, headers, body):
+        self._expect(method, 'GET')
+        try:
+            filters = json.loads(query.get('filter', '[]'))
+            offset = int(query.get('offset', 0))
+            max_ = int(query.get('max', 100))
+        except ValueError:
+            raise _HTTPError(400, u'Invalid list parameters')
+
+        def matches(document):
+            if document[u'deleted']:
+                return False
+            for filter_ in filters:
+                by = filter_.get(u'filter_by')
+                if by == u'status':
+                    if document[u'status'] not in filter_[u'statuses']:
+                        return False
+                elif by == u'tags':
+                    for tag in filter_[u'value']:
+                        if tag not in document[u'tags']:
+                            return False
+                elif by == u'mtime':
+                    mtime = _parse_time(document[u'time'])
+                    start = filter_.get(u'start_time')
+                    end = filter_.get(u'end_time')
+                    if start is not None and mtime < _parse_time(start):
+                        return False
+                    if end is not None and mtime > _parse_time(end):
+                        return False
+            return True
+
+        documents = sorted((d for d in self._documents.values()
+                            if matches(d)), key=lambda d: int(d[u'id']))
+        result = {u'total_matching': len(documents),
+                  u'documents': documents[offset:offset + max_]}
+        return (200, {'Content-Type': 'application/json; charset=utf-8'},
+                json.dumps(result))
+
+    def _on_update(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Preparation')
+        fields, _ = _parse_form(headers, body)
+        try:
+            update = json.loads(fields[u'json'])
+        except (KeyError, ValueError):
+            raise _HTTPError(400, u'Invalid document json')
+
+        for key in (u'title', u'daystosign', u'daystoremind', u'template',
+                    u'showheader', u'showpdfdownload', u'showrejectoption',
+                    u'allowrejectreason', u'showfooter', u'invitationmessage',
+                    u'confirmationmessage', u'apicallbackurl', u'lang',
+                    u'tags', u'timezone'):
+            if key in update:
+                document[key] = update[key]
+        # documents updated through the API are saved as drafts
+        document[u'saved'] = True
+        if u'signatories' in update:
+            old = {signatory[u'id']: signatory
+                   for signatory in document[u'signatories']}
+            signatories = []
+            for signatory_json in update[u'signatories']:
+                signatory = old.get(signatory_json.get(u'id'))
+                if signatory is None:
+                    signatory = self._signatory(
+                        signatory_json.get(u'author', False))
+                signatory.update(signatory_json)
+                signatories.append(signatory)
+            document[u'signatories'] = signatories
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_setattachments(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Preparation')
+        fields, files = _parse_form(headers, body)
+        attachments = []
+        for i in itertools.count():
+            details = fields.get(u'attachment_details_%d' % (i,))
+            if details is None:
+                break
+            details = json.loads(details)
+            key = u'attachment_%d' % (i,)
+            if key in files:
+                file_id = self._new_id()
+                self._files[file_id] = files[key]
+            else:
+                file_id = fields.get(key, details.get(u'file_id'))
+                if file_id not in self._files:
+                    raise _HTTPError(400, u'No such file: %s' % (file_id,))
+            attachments.append(
+                {u'id': file_id, u'name': details[u'name'],
+                 u'required': details.get(u'required', False),
+                 u'add_to_sealed_file': details.get(u'add_to_sealed_file',
+                                                    True)})
+        document[u'authorattachments'] = attachments
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _unsigned(self, document):
+        return [s for s in document[u'signatories']
+                if s[u'signs'] and s[u'signdate'] is None]
+
+    def _update_sign_order(self, document):
+        unsigned = self._unsigned(document)
+        if unsigned:
+            document[u'signorder'] = min(s[u'signorder'] for s in unsigned)
+        for signatory in document[u'signatories']:
+            signatory[u'current'] = (
+                signatory in unsigned and
+                signatory[u'signorder'] == document[u'signorder'])
+
+    def _on_ready(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Preparation')
+        if document[u'file'] is None:
+            raise _HTTPError(409, u'Document has no file')
+        now = self._clock()
+        document[u'status'] = u'Pending'
+        document[u'timeouttime'] = _iso_time(
+            now + document[u'daystosign'] * 24 * 3600)
+        if document[u'daystoremind'] is not None:
+            document[u'autoremindtime'] = _iso_time(
+                now + document[u'daystoremind'] * 24 * 3600)
+        for signatory in document[u'signatories']:
+            signatory[u'signlink'] = (
+                u'/s/%s/%s' % (document[u'id'], signatory[u'id']))
+        self._update_sign_order(document)
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_sign(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Pending')
+        for signatory in document[u'signatories']:
+            if signatory[u'id'] == args[1]:
+                break
+        else:
+            raise _HTTPError(404, u'No such signatory')
+        if not signatory[u'current']:
+            raise _HTTPError(409, u'Signatory can\'t sign now')
+        signatory[u'signdate'] = _iso_time(self._clock())
+        self._update_sign_order(document)
+        if not self._unsigned(document):
+            # sealed in the background, see _document()
+            document[u'status'] = u'Closed'
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_setsignatoryattachment(self, method, args, query, headers,
+                                   body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Pending')
+        for signatory in document[u'signatories']:
+            if signatory[u'id'] == args[1]:
+                break
+        else:
+            raise _HTTPError(404, u'No such signatory')
+        for attachment in signatory[u'attachments']:
+            if attachment[u'name'] == args[2]:
+                break
+        else:
+            raise _HTTPError(404, u'No such attachment')
+        attachment[u'file'] = self._store_upload(headers, body)
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_cancel(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Pending')
+        document[u'status'] = u'Canceled'
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_prolong(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Pending', u'Timedout')
+        fields, _ = _parse_form(headers, body)
+        try:
+            days = int(fields[u'days'])
+        except (KeyError, ValueError):
+            raise _HTTPError(400, u'Invalid number of days')
+        document[u'status'] = u'Pending'
+        document[u'timeouttime'] = _iso_time(
+            self._clock() + days * 24 * 3600)
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_remind(self, method, args, query, headers, body):
+        self._expect(method, 'POST')
+        document = self._document(args[0])
+        self._expect_status(document, u'Pending')
+        return self._respond_document(document)
+
+    def _on_delete(self, method, args, query, headers, body):
+        self._expect(method, 'DELETE')
+        document = self._document(args[0])
+        if document[u'status'] == u'Pending':
+            raise _HTTPError(409, u'Document is pending')
+        document[u'deleted'] = True
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_reallydelete(self, method, args, query, headers, body):
+        self._expect(method, 'DELETE')
+        document = self._document(args[0])
+        if not document[u'deleted']:
+            raise _HTTPError(409, u'Document is not in trash')
+        document[u'reallydeleted'] = True
+        self._touch(document)
+        return self._respond_document(document)
+
+    def _on_downloadfile(self, method, args, query, headers, body):
+        if method not in ('GET', 'HEAD'):
+            raise _HTTPError(405, u'Method not allowed')
+        document = self._document(args[0])
+        file_ids = [f[u'id'] for f in (document[u'file'],
+                                       document[u'sealedfile']) if f]
+        file_ids += [a[u'id'] for a in document[u'authorattachments']]
+        file_ids += [a[u'file'][u'id']
+                     for s in document[u'signatories']
+                     for a in s[u'attachments'] if a.get(u'file')]
+        if args[1] not in file_ids:
+            raise _HTTPError(404, u'No such file')
+        _, content = self._files[args[1]]
+        size = len(content)
+        response_headers = {'Content-Type': 'application/pdf',
+                            'Accept-Ranges': 'bytes'}
+
+        match = _RANGE.match(headers.get('range', ''))
+        if match is None or match.groups() == ('', ''):
+            return 200, response_headers, content
+        first, last = match.groups()
+        if first == '':
+            start, end = max(size - int(last), 0), size
+        else:
+            start = int(first)
+            end = size if last == '' else min(int(last) + 1, size)
+        if start >= size or start >= end:
+            response_headers['Content-Range'] = b'bytes */%d' % (size,)
+            return 416, response_headers, b''
+        response_headers['Content-Range'] = \
+            b'bytes %d-%d/%d' % (start, end - 1, size)
+        return 206, response_headers, content[start:end]
+
+
+class FakeTransport(adapters.BaseAdapter):
+    '''
+    requests transport adapter handing requests to a FakeScrive, without
+    any sockets.
+    '''
+
+    def __init__(self, fake):
+        super(FakeTransport, self).__init__()
+        self._fake = fake
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        body = request.body
+        if body is None:
+            body = b''
+        elif hasattr(body, 'read'):
+            body = body.read()
+        elif not isinstance(body, basestring):
+            body = b''.join(body)
+        headers = {key.lower(): val for key, val in request.headers.items()}
+        status, response_headers, content = self._fake.handle(
+            request.method, request.path_url, headers, body)
+        response_headers = dict(response_headers)
+        response_headers['Content-Length'] = str(len(content))
+        if request.method == 'HEAD':
+            content = b''
+
+        raw = urllib3_response.HTTPResponse(
+            body=io.BytesIO(content), headers=response_headers,
+            status=status, reason=httplib.responses.get(status),
+            preload_content=False, decode_content=False)
+        response = models.Response()
+        response.status_code = status
+        response.reason = raw.reason
+        response.headers = structures.CaseInsensitiveDict(response_headers)
+        response.encoding = utils.get_encoding_from_headers(response.headers)
+        response.raw = raw
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Quiet keep-alive request handler, subclasses implement _handle.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections.append(self.connection)
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get('content-length', 0))
+        return self.rfile.read(length)
+
+    def _handle(self):
+        raise NotImplementedError()
+
+    def do_GET(self):
+        self._handle()
+
+    do_POST = do_DELETE = do_HEAD = do_GET
+
+
+class _FakeHandler(_RequestHandler):
+
+    def _handle(self):
+        body = self._read_body()
+        status, headers, content = self.server.fake.handle(
+            self.command, self.path, dict(self.headers.items()), body)
+        self.send_response(status)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    '''
+    HTTP server running in a background thread between start() and
+    close(), handling each connection in a thread of its own.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class):
+        BaseHTTPServer.HTTPServer.__init__(self, server_address,
+                                           handler_class)
+        self.lock = threading.Lock()
+        self.connections = []
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+        self.server_close()
+        # wake up threads waiting on kept alive connections
+        with self.lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+
+class FakeScriveServer(object):
+    '''
+    Local HTTP server in a background thread, serving a FakeScrive,
+    for measuring clients over real connections. Port 0 picks a free
+    port, see api_hostname.
+    '''
+
+    def __init__(self, fake=None, host=b'127.0.0.1', port=0):
+        if fake is None:
+            fake = FakeScrive()
+        self._fake = fake
+        self._server = _ThreadingHTTPServer((host, port), _FakeHandler)
+        self._server.fake = fake
+        self._server.start()
+
+    @property
+    def fake(self):
+        return self._fake
+
+    @property
+    def api_hostname(self):
+        host, port = self._server.server_address
+        return b'%s:%d' % (host, port)
+
+    def api(self, **kwargs):
+        '''
+        Return Scrive client talking to this server over HTTP.
+        '''
+        return _scrive.Scrive(b'client', b'secret', b'token', b'secret',
+                              api_hostname=self.api_hostname, https=False,
+                              **kwargs)
+
+    def close(self):
+        self._server.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
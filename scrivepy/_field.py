@@ -79,6 +79,13 @@ class Field(_object.ScriveObject):
         super(Field, self)._set_read_only()
         self.placements._set_read_only()
 
+    def _is_dirty(self):
+        return self._dirty or self._placements._is_dirty()
+
+    def _set_clean(self):
+        self._placements._set_clean()
+        super(Field, self)._set_clean()
+
     def _to_json_obj(self):
         for placement in self.placements:
             placement._resolve_default_tip(self._default_placement_tip)
@@ -1,11 +1,9 @@
 import contextlib
 import os
-import shutil
 
-import requests
 import tvu
 
-from scrivepy import _object
+from scrivepy import _download, _object
 
 
 scrive_property = _object.scrive_property
@@ -25,13 +23,30 @@ class File(_object.ScriveObject):
     def document(self):
         raise AttributeError("can't set attribute")
 
-    def save_as(self, file_path):
+    def save_as(self, file_path, block_size=_download.CHUNK_SIZE,
+                fsync=False):
+        '''
+        Save the file to file_path, copying block_size bytes at a time
+        through one reused buffer. With fsync, the data is flushed to
+        disk before returning.
+        '''
+        with open(file_path, 'wb') as f:
+            _download.copy(self.stream(), f, block_size, fsync)
+
+    def save_to(self, dir_path, block_size=_download.CHUNK_SIZE,
+                fsync=False):
+        self.save_as(os.path.join(dir_path, self.name), block_size, fsync)
+
+    def iter_chunks(self, size=_download.CHUNK_SIZE):
+        '''
+        Iterate over the content in chunks of (at most) size bytes.
+        '''
         with contextlib.closing(self.stream()) as s:
-            with open(file_path, 'wb') as f:
-                shutil.copyfileobj(s, f)
-
-    def save_to(self, dir_path):
-        self.save_as(os.path.join(dir_path, self.name))
+            while True:
+                data = s.read(size)
+                if not data:
+                    return
+                yield data
 
     def get_bytes(self):
         with contextlib.closing(self.stream()) as s:
@@ -64,14 +79,37 @@ class RemoteFile(File):
     def id(self):
         return self._id
 
+    def _url_elems(self):
+        return [b'downloadfile', self._document.id, self.id, self.name]
+
     def stream(self):
-        def stream_get(*args, **kwargs):
-            kwargs = dict(kwargs)
-            kwargs['stream'] = True
-            return requests.get(*args, **kwargs)
-
-        response = self._api._make_request([b'downloadfile', self._document.id,
-                                            self.id, self.name],
-                                           method=stream_get)
-        response.raw.decode_content = True
-        return response.raw
+        '''
+        Return file-like object reading the file, which resumes the
+        download (with a Range request) if the connection fails.
+        '''
+        return _download.RangeStream(self._api, self._url_elems())
+
+    def save_as(self, file_path, block_size=_download.CHUNK_SIZE,
+                fsync=False, max_workers=1):
+        '''
+        Download the file to file_path. The file is written under
+        a temporary name and renamed once its length was verified, so
+        file_path never holds a partial download. Large files are
+        downloaded as max_workers parallel ranges.
+        '''
+        _download.save_as(self._api, self._url_elems(), file_path,
+                          max_workers=max_workers, block_size=block_size,
+                          fsync=fsync)
+
+    def save_to(self, dir_path, block_size=_download.CHUNK_SIZE,
+                fsync=False, max_workers=1):
+        self.save_as(os.path.join(dir_path, self.name), block_size, fsync,
+                     max_workers)
+
+    def _remote_size(self):
+        return _download.remote_size(self._api, self._url_elems())
+
+    def get_bytes(self):
+        # not streamed, so that concurrent downloads can be coalesced
+        response = self._api._make_request(self._url_elems(), method=b'GET')
+        return response.content
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from requests import adapters
+
+
+HOOKS = ('before_request', 'after_response', 'on_retry', 'on_error')
+
+
+def default_hooks():
+    return dict((event, []) for event in HOOKS)
+
+
+def dispatch_hook(hooks, event, info):
+    for hook in hooks[event]:
+        hook(info)
+
+
+class RequestInfo(object):
+    '''
+    Details of a single API call, passed to the request hooks.
+
+    Byte counters count bytes on the wire, *_uncompressed counters
+    count them before compression (or after decompression).
+
+    Times are in seconds. connect_time covers name resolution, TCP and
+    TLS handshakes and is 0 when a pooled connection was reused.
+    ttfb is the time until response headers were received (of the last
+    attempt), total_time covers the whole call, including retries and
+    parse_time (time spent parsing the response).
+
+    coalesced is True if the response was shared with a concurrent
+    identical request of another thread.
+    '''
+
+    def __init__(self, endpoint, document_id, method, url):
+        self.endpoint = endpoint
+        self.document_id = document_id
+        self.method = method
+        self.url = url
+        self.attempt = 0
+        self.status_code = None
+        self.bytes_sent = None
+        self.bytes_sent_uncompressed = None
+        self.bytes_received = None
+        self.bytes_received_uncompressed = None
+        self.start_time = None
+        self.connect_time = 0.
+        self.ttfb = None
+        self.total_time = None
+        self.parse_time = None
+        self.retry_delay = None
+        self.exception = None
+        self.coalesced = False
+
+
+_connect_times = threading.local()
+
+
+def reset_connect_time():
+    _connect_times.total = 0.
+
+
+def get_connect_time():
+    return getattr(_connect_times, 'total', 0.)
+
+
+def _timed_connection_class(base):
+
+    class TimedConnection(base):
+
+        def connect(self):
+            start = time.time()
+            try:
+                return base.connect(self)
+            finally:
+                _connect_times.total = \
+                    get_connect_time() + time.time() - start
+
+    return TimedConnection
+
+
+class TimedHTTPAdapter(adapters.HTTPAdapter):
+    '''
+    HTTPAdapter measuring how long it takes to open new connections.
+    '''
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        pool_classes = {}
+        pool_classes_by_scheme = self.poolmanager.pool_classes_by_scheme
+        for scheme, pool_cls in pool_classes_by_scheme.items():
+            pool_classes[scheme] = type(
+                pool_cls.__name__, (pool_cls,),
+                {'ConnectionCls':
+                 _timed_connection_class(pool_cls.ConnectionCls)})
+        self.poolmanager.pool_classes_by_scheme = pool_classes
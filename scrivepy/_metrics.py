@@ -0,0 +1,190 @@
+import bisect
+import threading
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self._buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.
+        self._count = 0
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def snapshot(self):
+        cumulative = []
+        total = 0
+        for bound, count in zip(self._buckets + (float('inf'),),
+                                self._counts):
+            total += count
+            cumulative.append((bound, total))
+        return {u'buckets': cumulative,
+                u'sum': self._sum,
+                u'count': self._count}
+
+
+class _EndpointMetrics(object):
+
+    def __init__(self, buckets):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_sent_uncompressed = 0
+        self.bytes_received = 0
+        self.bytes_received_uncompressed = 0
+        self.connect_time = 0.
+        self.latency = Histogram(buckets)
+        self.ttfb = Histogram(buckets)
+        self.parse_time = Histogram(buckets)
+
+    def snapshot(self):
+        return {u'requests': self.requests,
+                u'errors': self.errors,
+                u'retries': self.retries,
+                u'bytes_sent': self.bytes_sent,
+                u'bytes_sent_uncompressed': self.bytes_sent_uncompressed,
+                u'bytes_received': self.bytes_received,
+                u'bytes_received_uncompressed':
+                self.bytes_received_uncompressed,
+                u'connect_time': self.connect_time,
+                u'latency': self.latency.snapshot(),
+                u'ttfb': self.ttfb.snapshot(),
+                u'parse_time': self.parse_time.snapshot()}
+
+
+def _format_bound(bound):
+    if bound == float('inf'):
+        return u'+Inf'
+    return repr(bound)
+
+
+class MetricsCollector(object):
+    '''
+    Per-endpoint request metrics gathered from Scrive request hooks.
+
+    Latency, time to first byte and parse time histograms tell apart
+    time spent in the network/server and in client-side parsing.
+    '''
+
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def install(self, api):
+        api.register_hook(u'after_response', self._on_response)
+        api.register_hook(u'on_retry', self._on_retry)
+        api.register_hook(u'on_error', self._on_error)
+
+    def uninstall(self, api):
+        api.deregister_hook(u'after_response', self._on_response)
+        api.deregister_hook(u'on_retry', self._on_retry)
+        api.deregister_hook(u'on_error', self._on_error)
+
+    def _endpoint(self, info):
+        metrics = self._endpoints.get(info.endpoint)
+        if metrics is None:
+            metrics = _EndpointMetrics(self._buckets)
+            self._endpoints[info.endpoint] = metrics
+        return metrics
+
+    def _record(self, metrics, info):
+        metrics.requests += 1
+        metrics.bytes_sent += info.bytes_sent or 0
+        metrics.bytes_sent_uncompressed += \
+            info.bytes_sent_uncompressed or 0
+        metrics.bytes_received += info.bytes_received or 0
+        metrics.bytes_received_uncompressed += \
+            info.bytes_received_uncompressed or 0
+        metrics.connect_time += info.connect_time
+        if info.total_time is not None:
+            metrics.latency.observe(info.total_time)
+        if info.ttfb is not None:
+            metrics.ttfb.observe(info.ttfb)
+        if info.parse_time is not None:
+            metrics.parse_time.observe(info.parse_time)
+
+    def _on_response(self, info):
+        with self._lock:
+            self._record(self._endpoint(info), info)
+
+    def _on_error(self, info):
+        with self._lock:
+            metrics = self._endpoint(info)
+            metrics.errors += 1
+            self._record(metrics, info)
+
+    def _on_retry(self, info):
+        with self._lock:
+            self._endpoint(info).retries += 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def snapshot(self):
+        '''
+        Return metrics of all endpoints as a dict keyed by endpoint name.
+        '''
+        with self._lock:
+            return dict((endpoint, metrics.snapshot())
+                        for endpoint, metrics in self._endpoints.items())
+
+    def to_prometheus(self, prefix=u'scrive'):
+        '''
+        Return metrics in Prometheus text exposition format.
+        '''
+        snapshot = self.snapshot()
+        lines = []
+        counters = [(u'requests_total', u'requests', u'Finished requests.'),
+                    (u'request_errors_total', u'errors', u'Failed requests.'),
+                    (u'request_retries_total', u'retries', u'Retries.'),
+                    (u'request_sent_bytes_total', u'bytes_sent',
+                     u'Bytes sent in request bodies.'),
+                    (u'request_sent_uncompressed_bytes_total',
+                     u'bytes_sent_uncompressed',
+                     u'Bytes sent in request bodies, before compression.'),
+                    (u'request_received_bytes_total', u'bytes_received',
+                     u'Bytes received in response bodies.'),
+                    (u'request_received_uncompressed_bytes_total',
+                     u'bytes_received_uncompressed',
+                     u'Bytes received in response bodies, '
+                     u'after decompression.'),
+                    (u'request_connect_seconds_total', u'connect_time',
+                     u'Time spent opening connections.')]
+        for name, key, help_text in counters:
+            name = prefix + u'_' + name
+            lines.append(u'# HELP %s %s' % (name, help_text))
+            lines.append(u'# TYPE %s counter' % (name,))
+            for endpoint in sorted(snapshot):
+                lines.append(u'%s{endpoint="%s"} %r'
+                             % (name, endpoint, snapshot[endpoint][key]))
+
+        histograms = [(u'request_duration_seconds', u'latency',
+                       u'Total duration of requests.'),
+                      (u'request_ttfb_seconds', u'ttfb',
+                       u'Time until response headers were received.'),
+                      (u'request_parse_seconds', u'parse_time',
+                       u'Time spent parsing responses.')]
+        for name, key, help_text in histograms:
+            name = prefix + u'_' + name
+            lines.append(u'# HELP %s %s' % (name, help_text))
+            lines.append(u'# TYPE %s histogram' % (name,))
+            for endpoint in sorted(snapshot):
+                histogram = snapshot[endpoint][key]
+                for bound, count in histogram[u'buckets']:
+                    lines.append(u'%s_bucket{endpoint="%s",le="%s"} %d'
+                                 % (name, endpoint,
+                                    _format_bound(bound), count))
+                lines.append(u'%s_sum{endpoint="%s"} %r'
+                             % (name, endpoint, histogram[u'sum']))
+                lines.append(u'%s_count{endpoint="%s"} %d'
+                             % (name, endpoint, histogram[u'count']))
+        return u'\n'.join(lines) + u'\n'
@@ -18,6 +18,8 @@ class ScriveObject(object):
         self._invalid = False
         self._read_only = False
         self._api = None
+        # modified since created/fetched from the server
+        self._dirty = False
 
     def _to_json(self):
         return json.dumps(self, cls=_JSONEncoder)
@@ -39,6 +41,14 @@ class ScriveObject(object):
         self._check_invalid()
         if self._read_only:
             raise _exceptions.ReadOnlyScriveObject()
+        # every modification goes through here
+        self._dirty = True
+
+    def _is_dirty(self):
+        return self._dirty
+
+    def _set_clean(self):
+        self._dirty = False
 
     def _set_api(self, api, document):
         self._api = api
@@ -0,0 +1,315 @@
+import calendar
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from multiprocessing import pool
+
+import requests
+from requests import adapters
+
+from scrivepy import _document, _exceptions, _rate_limit
+
+
+_ACTIVE_STATUSES = (_document.DocumentStatus.preparation,
+                    _document.DocumentStatus.pending)
+
+
+def _timestamp(datetime_):
+    if datetime_ is None:
+        return None
+    if datetime_.tzinfo is None:
+        return calendar.timegm(datetime_.timetuple())
+    return calendar.timegm(datetime_.utctimetuple())
+
+
+class DocumentChange(object):
+    '''
+    Change of a polled document, passed to the poller's handler.
+
+    previous is the version known before the poll, document the new
+    one. finished is True if the document left preparation/pending
+    status and is no longer polled.
+    '''
+
+    def __init__(self, previous, document):
+        self.previous = previous
+        self.document = document
+
+    @property
+    def document_id(self):
+        return self.document.id
+
+    @property
+    def status_changed(self):
+        return self.previous.status != self.document.status
+
+    @property
+    def sign_order_changed(self):
+        return (self.previous.current_sign_order !=
+                self.document.current_sign_order)
+
+    @property
+    def finished(self):
+        return self.document.status not in _ACTIVE_STATUSES
+
+
+class _Entry(object):
+
+    def __init__(self, document, last_change):
+        self.document = document
+        self.last_change = last_change
+        self.next_time = None
+        self.errors = 0
+        self.seq = None
+
+
+class DocumentPoller(object):
+    '''
+    Polls documents in preparation or pending status for changes, with
+    conditional refresh_document requests, and calls handler with a
+    DocumentChange for every change found. Documents leaving those
+    statuses are no longer polled.
+
+    Documents are kept in a priority queue by the time of their next
+    poll, so polling thousands of them costs only the due ones. The
+    interval grows with the time since the last activity (change of
+    the document or a passed autoremind_time or signing_deadline)
+    times idle_factor, between min_interval and max_interval. Advances
+    of current_sign_order are changes like any other, they aren't
+    predictable and don't shorten the interval on their own. Polls are
+    scheduled just after the next autoremind_time or signing_deadline,
+    when a change is likely. Failed polls are retried after
+    exponentially growing intervals and reported to error_handler (with
+    the document id and the exception).
+
+    Polls run over a pool of max_workers threads, kept until close(),
+    and, if polls_per_second or rate_limiter is given, at a bounded
+    rate. Call poll() periodically or start() a background thread.
+    '''
+
+    def __init__(self, api, handler, error_handler=None, min_interval=30.,
+                 max_interval=6 * 3600., idle_factor=.1,
+                 max_workers=adapters.DEFAULT_POOLSIZE,
+                 polls_per_second=None, rate_limiter=None, clock=time.time):
+        if rate_limiter is None and polls_per_second is not None:
+            rate_limiter = _rate_limit.RateLimiter(
+                requests_per_second=polls_per_second)
+        self._api = api
+        self._handler = handler
+        self._error_handler = error_handler
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._idle_factor = idle_factor
+        self._max_workers = max_workers
+        self._rate_limiter = rate_limiter
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._entries = {}
+        # (next poll time, seq, document id), entries whose seq differs
+        # were rescheduled or removed and are skipped
+        self._queue = []
+        self._seq = itertools.count()
+        self._thread = None
+        self._stopped = False
+        # started on the first poll
+        self._workers = None
+        self._workers_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, document_id):
+        return document_id in self._entries
+
+    def add(self, document):
+        '''
+        Start polling document (replacing a version already polled).
+        '''
+        now = self._clock()
+        last_change = _timestamp(document.modification_time)
+        if last_change is None or last_change > now:
+            last_change = now
+        with self._condition:
+            entry = _Entry(document, last_change)
+            self._entries[document.id] = entry
+            self._schedule(entry, now)
+            self._condition.notify()
+
+    def remove(self, document_id):
+        '''
+        Stop polling document with document_id.
+        '''
+        with self._condition:
+            self._entries.pop(document_id, None)
+
+    def next_poll_time(self, document_id=None):
+        '''
+        Return time of the next poll of document_id (of any document if
+        not given), None if nothing is polled.
+        '''
+        with self._condition:
+            if document_id is not None:
+                entry = self._entries.get(document_id)
+                return None if entry is None else entry.next_time
+            self._drop_stale()
+            return self._queue[0][0] if self._queue else None
+
+    def _poll_interval(self, entry, now):
+        if entry.errors:
+            interval = self._min_interval * 2 ** (entry.errors - 1)
+            return min(interval, self._max_interval)
+
+        document = entry.document
+        last_activity = entry.last_change
+        next_event = None
+        for event_time in (_timestamp(document.autoremind_time),
+                           _timestamp(document.signing_deadline)):
+            if event_time is None:
+                continue
+            if event_time <= now:
+                last_activity = max(last_activity, event_time)
+            elif next_event is None or event_time < next_event:
+                next_event = event_time
+
+        interval = (now - last_activity) * self._idle_factor
+        interval = min(max(interval, self._min_interval), self._max_interval)
+        if next_event is not None:
+            # the server needs a moment to act on the event
+            interval = min(interval, next_event - now + self._min_interval)
+        return interval
+
+    def _schedule(self, entry, now):
+        entry.next_time = now + self._poll_interval(entry, now)
+        entry.seq = next(self._seq)
+        heapq.heappush(self._queue,
+                       (entry.next_time, entry.seq, entry.document.id))
+
+    def _drop_stale(self):
+        while self._queue:
+            _, seq, document_id = self._queue[0]
+            entry = self._entries.get(document_id)
+            if entry is not None and entry.seq == seq:
+                return
+            heapq.heappop(self._queue)
+
+    def _pop_due(self, now):
+        due = []
+        with self._condition:
+            while True:
+                self._drop_stale()
+                if not self._queue or self._queue[0][0] > now:
+                    return due
+                _, _, document_id = heapq.heappop(self._queue)
+                entry = self._entries[document_id]
+                entry.seq = None
+                due.append(entry)
+
+    def _refresh(self, entry):
+        try:
+            if self._rate_limiter is not None:
+                with self._rate_limiter:
+                    document = self._api.refresh_document(entry.document)
+            else:
+                document = self._api.refresh_document(entry.document)
+            return entry, document, None
+        except (_exceptions.Error, requests.RequestException) as e:
+            return entry, None, e
+
+    def poll(self):
+        '''
+        Poll all documents that are due and deliver their changes.
+        Return the number of documents polled.
+        '''
+        due = self._pop_due(self._clock())
+        if not due:
+            return 0
+        with self._workers_lock:
+            if self._workers is None:
+                self._workers = pool.ThreadPool(self._max_workers)
+            workers = self._workers
+        results = workers.imap_unordered(self._refresh, due)
+        changes = []
+        errors = []
+        for entry, document, error in results:
+            now = self._clock()
+            with self._condition:
+                if self._entries.get(entry.document.id) is not entry:
+                    # removed or replaced while it was polled
+                    continue
+                if error is not None:
+                    entry.errors += 1
+                    self._schedule(entry, now)
+                    errors.append((entry.document.id, error))
+                    continue
+                entry.errors = 0
+                if document is not entry.document:
+                    changes.append(DocumentChange(entry.document, document))
+                    entry.document = document
+                    entry.last_change = now
+                if document.status in _ACTIVE_STATUSES:
+                    self._schedule(entry, now)
+                else:
+                    del self._entries[document.id]
+
+        # all documents are rescheduled before handlers are called
+        if self._error_handler is not None:
+            for document_id, error in errors:
+                self._error_handler(document_id, error)
+        for change in changes:
+            self._handler(change)
+        return len(due)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                next_time = self.next_poll_time()
+                if next_time is None:
+                    self._condition.wait()
+                    continue
+                timeout = next_time - self._clock()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+            try:
+                self.poll()
+            except Exception:
+                traceback.print_exc()
+
+    def start(self):
+        '''
+        Poll in a background thread, until close() is called.
+        '''
+        with self._condition:
+            if self._thread is not None:
+                raise _exceptions.Error(u'Poller already started')
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def close(self):
+        '''
+        Stop the background thread (after the polls in progress) and
+        the worker threads.
+        '''
+        with self._condition:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+        with self._workers_lock:
+            workers, self._workers = self._workers, None
+        if workers is not None:
+            workers.close()
+            workers.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -0,0 +1,103 @@
+import threading
+import time
+
+
+class RateLimiter(object):
+    '''
+    Token bucket limiting the rate of requests and the number of requests
+    in flight. It's thread-safe, so one limiter can be shared by all
+    threads and Scrive clients using the same credentials. Streamed
+    downloads are in flight until their stream is closed.
+    '''
+
+    def __init__(self, requests_per_second=None, max_in_flight=None,
+                 burst=None):
+        if requests_per_second is not None and requests_per_second <= 0:
+            raise ValueError(u'requests_per_second must be positive')
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError(u'max_in_flight must be at least 1')
+        if burst is None:
+            burst = max(1., requests_per_second or 1.)
+        self._requests_per_second = requests_per_second
+        self._max_in_flight = max_in_flight
+        self._burst = float(burst)
+        self._tokens = self._burst
+        self._last_refill = time.time()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def requests_per_second(self):
+        return self._requests_per_second
+
+    @property
+    def max_in_flight(self):
+        return self._max_in_flight
+
+    def _refill(self, now):
+        if self._requests_per_second is None:
+            return
+        elapsed = max(0., now - self._last_refill)
+        self._tokens = min(self._burst,
+                           self._tokens +
+                           elapsed * self._requests_per_second)
+        self._last_refill = now
+
+    def acquire(self):
+        '''
+        Block until a request is allowed to start.
+        '''
+        with self._condition:
+            while True:
+                now = time.time()
+                self._refill(now)
+                if (self._max_in_flight is not None and
+                        self._in_flight >= self._max_in_flight):
+                    # woken up by release()
+                    self._condition.wait()
+                elif (self._requests_per_second is not None and
+                      self._tokens < 1.):
+                    missing = 1. - self._tokens
+                    self._condition.wait(missing / self._requests_per_second)
+                else:
+                    if self._requests_per_second is not None:
+                        self._tokens -= 1.
+                    self._in_flight += 1
+                    return
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
+
+
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def shared_rate_limiter(key, requests_per_second=None, max_in_flight=None):
+    '''
+    Return the process-wide limiter for key, creating it on first use.
+    Asking for the limiter of key with different settings than it was
+    created with raises ValueError, instead of silently using either.
+    '''
+    with _shared_limiters_lock:
+        limiter = _shared_limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(requests_per_second=requests_per_second,
+                                  max_in_flight=max_in_flight)
+            _shared_limiters[key] = limiter
+        elif (limiter.requests_per_second != requests_per_second or
+              limiter.max_in_flight != max_in_flight):
+            raise ValueError(
+                u'Rate limiter for these credentials already exists with '
+                u'requests_per_second=%s, max_in_flight=%s'
+                % (limiter.requests_per_second, limiter.max_in_flight))
+        return limiter
@@ -0,0 +1,112 @@
+import random
+import time
+
+import requests
+from requests.packages.urllib3 import exceptions as urllib3_exceptions
+
+
+def is_connect_error(exc):
+    '''
+    Check if exc means that connection couldn't be established, so the
+    request never reached the server.
+    '''
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError) and exc.args:
+        reason = getattr(exc.args[0], 'reason', None)
+        return isinstance(reason, urllib3_exceptions.NewConnectionError)
+    return False
+
+
+class RetryPolicy(object):
+    '''
+    Decides if and when failed requests are retried.
+
+    Idempotent requests are retried after connection errors, timeouts
+    and transient server errors. Other requests are retried only if the
+    connection couldn't be established. Retries are delayed using
+    exponential backoff with full jitter and stop after max_retries
+    or when deadline (in seconds, since the first attempt) would be
+    exceeded. Retry-After of the server is honored up to max_backoff.
+
+    Each attempt times out (connecting or waiting for data) after
+    timeout seconds or when the deadline passes, whichever is sooner,
+    so a stalled connection can't block forever.
+    '''
+
+    RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+    def __init__(self, max_retries=3, backoff_factor=.5, max_backoff=30.,
+                 deadline=None, retry_statuses=RETRY_STATUSES,
+                 timeout=None):
+        if max_retries < 0:
+            raise ValueError(u'max_retries must be non-negative')
+        self._max_retries = max_retries
+        self._backoff_factor = backoff_factor
+        self._max_backoff = max_backoff
+        self._deadline = deadline
+        self._retry_statuses = frozenset(retry_statuses)
+        self._timeout = timeout
+
+    @property
+    def max_retries(self):
+        return self._max_retries
+
+    @property
+    def deadline(self):
+        return self._deadline
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    def request_timeout(self, start_time):
+        '''
+        Return timeout (in seconds) for an attempt of a request started
+        at start_time or None if it may wait forever.
+        '''
+        timeout = self._timeout
+        if self._deadline is not None:
+            remaining = start_time + self._deadline - time.time()
+            # requests doesn't accept zero, the attempt fails right away
+            remaining = max(remaining, .001)
+            timeout = remaining if timeout is None else min(timeout,
+                                                            remaining)
+        return timeout
+
+    def backoff(self, attempt):
+        '''
+        Return delay (in seconds) before retry number attempt (from 0).
+        '''
+        ceiling = min(self._max_backoff, self._backoff_factor * 2 ** attempt)
+        return random.uniform(0., ceiling)
+
+    def _is_retryable(self, idempotent, exception, response):
+        if exception is not None:
+            if is_connect_error(exception):
+                return True
+            return idempotent and isinstance(
+                exception, (requests.exceptions.ConnectionError,
+                            requests.exceptions.Timeout))
+        return idempotent and response.status_code in self._retry_statuses
+
+    def retry_delay(self, attempt, start_time, idempotent,
+                    exception=None, response=None):
+        '''
+        Return delay before retrying a failed attempt or None if the
+        request shouldn't be retried.
+        '''
+        if attempt >= self._max_retries:
+            return None
+        if not self._is_retryable(idempotent, exception, response):
+            return None
+        delay = self.backoff(attempt)
+        if response is not None:
+            retry_after = response.headers.get('retry-after', '')
+            if retry_after.isdigit():
+                delay = max(delay, min(float(retry_after),
+                                       self._max_backoff))
+        if (self._deadline is not None and
+                time.time() + delay - start_time > self._deadline):
+            return None
+        return delay
@@ -1,11 +1,30 @@
 import cStringIO
+import contextlib
 import json
+import sys
+import threading
+import zlib
+import time
 import urllib
+from multiprocessing import pool
 from os import path
 
 import requests
+from requests import adapters
 
-from scrivepy import _document
+from scrivepy import _attachment_registry, _cache, _document, _download, \
+    _exceptions, _hooks, _rate_limit, _retry, _single_flight, _upload
+
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _entity_tag(etag, object_version):
+    if etag is not None:
+        return etag
+    return b'"%s"' % (object_version,)
 
 
 class Scrive(object):
@@ -14,7 +33,14 @@ class Scrive(object):
                  client_credentials_secret,
                  token_credentials_identifier,
                  token_credentials_secret,
-                 api_hostname=b'scrive.com', https=True):
+                 api_hostname=b'scrive.com', https=True,
+                 pool_connections=adapters.DEFAULT_POOLSIZE,
+                 pool_maxsize=adapters.DEFAULT_POOLSIZE,
+                 keep_alive=True, requests_per_second=None,
+                 max_in_flight=None, rate_limiter=None, retry_policy=None,
+                 hooks=None, request_compression_threshold=None,
+                 document_cache=None, coalesce_requests=True,
+                 attachment_registry=None, transport=None):
         self._api_hostname = api_hostname
         self._https = https
         proto = b'https' if https else b'http'
@@ -29,7 +55,65 @@ class Scrive(object):
         oauth_string = b','.join([key + b'=' + val
                                   for key, val in oauth_elems.items()])
 
-        self._headers = {b'authorization': oauth_string}
+        self._headers = {b'authorization': oauth_string,
+                         b'Accept-Encoding': b'gzip, deflate'}
+        if not keep_alive:
+            self._headers[b'Connection'] = b'close'
+
+        # one session per client, so that connections to api_hostname
+        # are kept alive and reused by all requests (downloads included)
+        self._session = requests.Session()
+        # transport is a requests transport adapter replacing HTTP,
+        # e.g. FakeScrive.transport()
+        if transport is None:
+            transport = _hooks.TimedHTTPAdapter(
+                pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self._session.mount(proto + b'://', transport)
+        self._pool_maxsize = pool_maxsize
+        self._closed = False
+        # request bodies at least that big (in bytes) are sent gzipped,
+        # only if the server is known to accept compressed requests
+        self._request_compression_threshold = request_compression_threshold
+        self._document_cache = document_cache
+        # author attachments with known content are referenced by file id
+        self._attachment_registry = attachment_registry
+        # concurrent identical reads share one request
+        if coalesce_requests:
+            self._single_flight = _single_flight.SingleFlight()
+        else:
+            self._single_flight = None
+
+        if rate_limiter is None and (requests_per_second is not None or
+                                     max_in_flight is not None):
+            # clients using the same credentials share the limit
+            limiter_key = (api_hostname, client_credentials_identifier,
+                           token_credentials_identifier)
+            rate_limiter = _rate_limit.shared_rate_limiter(
+                limiter_key, requests_per_second=requests_per_second,
+                max_in_flight=max_in_flight)
+        self._rate_limiter = rate_limiter
+
+        if retry_policy is None:
+            retry_policy = _retry.RetryPolicy()
+        self._retry_policy = retry_policy
+
+        self._hooks = _hooks.default_hooks()
+        for event, callbacks in (hooks or {}).items():
+            for callback in callbacks:
+                self.register_hook(event, callback)
+
+    def close(self):
+        '''
+        Close all pooled connections. The client can't be used afterwards.
+        '''
+        self._closed = True
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
 
     @property
     def api_hostname(self):
@@ -39,96 +123,702 @@ class Scrive(object):
     def https(self):
         return self._https
 
-    def _make_request(self, url_elems, method=requests.post,
-                      data=None, files=None, params=None):
+    @property
+    def rate_limiter(self):
+        return self._rate_limiter
+
+    @property
+    def retry_policy(self):
+        return self._retry_policy
+
+    @property
+    def document_cache(self):
+        return self._document_cache
+
+    @property
+    def attachment_registry(self):
+        return self._attachment_registry
+
+    def register_hook(self, event, hook):
+        '''
+        Register a callback for one of the request events (before_request,
+        after_response, on_retry, on_error). It's called with RequestInfo.
+        '''
+        if event not in self._hooks:
+            raise ValueError(u'Unknown hook event: %s' % (event,))
+        self._hooks[event].append(hook)
+
+    def deregister_hook(self, event, hook):
+        try:
+            self._hooks[event].remove(hook)
+            return True
+        except (KeyError, ValueError):
+            return False
+
+    def _make_request(self, url_elems, method=b'POST', data=None,
+                      files=None, params=None, stream=False, parse=None,
+                      compress=False, headers=None):
+        if self._closed:
+            raise _exceptions.Error(u'Scrive client is closed')
 
         url = self._api_url + b'/'.join(url_elems)
 
         if params is not None:
             url += '?' + urllib.urlencode(params)
-        print url
 
-        headers = dict(self._headers)
+        headers = dict(self._headers, **(headers or {}))
         if files is None:
-            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers.setdefault('Content-Type',
+                               'application/x-www-form-urlencoded')
 
-        return method(url, data=data, headers=headers, files=files)
+        endpoint = url_elems[0]
+        # createfromtemplate is called with template id
+        if len(url_elems) > 1 and endpoint != 'createfromtemplate':
+            document_id = url_elems[1]
+        else:
+            document_id = None
+        info = _hooks.RequestInfo(endpoint, document_id, method, url)
+
+        threshold = self._request_compression_threshold
+        if compress and files is None and threshold is not None:
+            if isinstance(data, dict):
+                data = urllib.urlencode(data)
+            info.bytes_sent_uncompressed = len(data)
+            if len(data) >= threshold:
+                data = _gzip(data)
+                headers['Content-Encoding'] = 'gzip'
+
+        _hooks.dispatch_hook(self._hooks, 'before_request', info)
+
+        try:
+            def send():
+                return self._send_with_retries(info, method, url, data=data,
+                                               headers=headers, files=files,
+                                               stream=stream)
+
+            if (self._single_flight is not None and method == b'GET' and
+                    not stream):
+                key = (document_id, url, headers.get(b'If-None-Match'),
+                       headers.get(b'Range'))
+                # callers waiting for another thread's request never
+                # get to _send_with_retries
+                info.start_time = time.time()
+                response, info.coalesced = self._single_flight.do(key, send)
+                info.status_code = response.status_code
+            else:
+                response = send()
+            if not stream:
+                info.bytes_received_uncompressed = len(response.content)
+                # bytes actually read from the socket
+                info.bytes_received = response.raw.tell()
+            if parse is None:
+                result = response
+            else:
+                parse_start = time.time()
+                result = parse(response)
+                info.parse_time = time.time() - parse_start
+        except Exception as e:
+            info.exception = e
+            info.total_time = time.time() - info.start_time
+            _hooks.dispatch_hook(self._hooks, 'on_error', info)
+            raise
+
+        info.total_time = time.time() - info.start_time
+        _hooks.dispatch_hook(self._hooks, 'after_response', info)
+        return result
 
-    def _make_doc_request(self, url_elems, method=requests.post,
-                          data=None, files=None):
-        response = self._make_request(url_elems, method=method,
-                                      data=data, files=files)
-        document = _document.Document._from_json_obj(response.json())
+    def _send_with_retries(self, info, method, url, files, **kwargs):
+        # uploaded files have to be rewound before retrying
+        file_positions = [(file_obj, file_obj.tell())
+                          for _, file_obj, _ in (files or {}).values()
+                          if hasattr(file_obj, 'seek')]
+        body = kwargs.get('data')
+        if not isinstance(body, _upload.MultipartBody):
+            body = None
+        idempotent = method in (b'GET', b'HEAD')
+        _hooks.reset_connect_time()
+        info.start_time = time.time()
+        while True:
+            for file_obj, position in file_positions:
+                file_obj.seek(position)
+            if body is not None:
+                body.rewind()
+            try:
+                response = self._send(
+                    method, url, files=files,
+                    timeout=self._retry_policy.request_timeout(
+                        info.start_time), **kwargs)
+            except requests.RequestException as e:
+                info.connect_time = _hooks.get_connect_time()
+                delay = self._retry_policy.retry_delay(
+                    info.attempt, info.start_time, idempotent, exception=e)
+                if delay is None:
+                    raise
+                info.exception = e
+            else:
+                info.connect_time = _hooks.get_connect_time()
+                info.status_code = response.status_code
+                info.ttfb = response.elapsed.total_seconds()
+                info.bytes_sent = int(
+                    response.request.headers.get('Content-Length', 0))
+                if info.bytes_sent_uncompressed is None:
+                    info.bytes_sent_uncompressed = info.bytes_sent
+                delay = self._retry_policy.retry_delay(
+                    info.attempt, info.start_time, idempotent,
+                    response=response)
+                if delay is None:
+                    if kwargs.get('stream') and not response.ok:
+                        # responses of raised HTTPErrors aren't closed by
+                        # callers, the (small) error body is read first
+                        response.content
+                        response.close()
+                    response.raise_for_status()
+                    return response
+                response.close()
+            info.retry_delay = delay
+            _hooks.dispatch_hook(self._hooks, 'on_retry', info)
+            info.exception = None
+            info.attempt += 1
+            time.sleep(delay)
+
+    def _send(self, method, url, **kwargs):
+        limiter = self._rate_limiter
+        if limiter is None:
+            return self._session.request(method, url, **kwargs)
+        limiter.acquire()
+        try:
+            response = self._session.request(method, url, **kwargs)
+        except BaseException:
+            limiter.release()
+            raise
+        if not kwargs.get('stream'):
+            limiter.release()
+            return response
+
+        # the body of a streamed response is still being downloaded,
+        # so the slot is kept until the response is closed
+        close = response.close
+        released = []
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    limiter.release()
+        response.close = close_and_release
+        return response
+
+    def _decode_json(self, content):
+        try:
+            encoding = requests.utils.guess_json_utf(content)
+            if encoding not in (None, 'utf-8'):
+                return json.loads(content.decode(encoding))
+            # utf-8 bytes are parsed directly, without decoding
+            # the whole body to unicode first
+            return json.loads(content)
+        except ValueError as e:
+            raise _exceptions.InvalidResponse(e, content)
+
+    def _document_from_json(self, json_obj, etag=None):
+        document = _document.Document._from_json_obj(json_obj)
+        document._etag = etag
         document._set_api(self, document)
         return document
 
+    def _parse_document(self, response):
+        return self._document_from_json(self._decode_json(response.content),
+                                        response.headers.get('ETag'))
+
+    def _document_from_cache(self, entry):
+        document = self._document_from_json(self._decode_json(entry.content),
+                                            entry.etag)
+        if self._document_cache.read_only:
+            document._set_read_only()
+        return document
+
+    def _invalidate_cached(self, document_id):
+        if self._document_cache is not None:
+            self._document_cache.invalidate(document_id)
+        if self._single_flight is not None:
+            # reads after a change mustn't get a response sent before it
+            self._single_flight.forget(lambda key: key[0] == document_id)
+
+    def _make_doc_request(self, url_elems, method=b'POST',
+                          data=None, files=None, compress=False,
+                          headers=None):
+        return self._make_request(url_elems, method=method, data=data,
+                                  files=files, parse=self._parse_document,
+                                  compress=compress, headers=headers)
+
     def _make_doc_request_invalidate(self, url_elems, document,
-                                     method=requests.post, data=None,
-                                     files=None):
-        result = self._make_doc_request(url_elems, method,
-                                        data=data, files=files)
+                                     method=b'POST', data=None,
+                                     files=None, compress=False,
+                                     headers=None):
+        try:
+            result = self._make_doc_request(url_elems, method, data=data,
+                                            files=files, compress=compress,
+                                            headers=headers)
+        finally:
+            self._invalidate_cached(document._id)
         document._set_invalid()
         return result
 
-    def create_document_from_file(self, file_path):
-        if file_path is None:
-            files = None
-        else:
-            files = {'file': (path.basename(file_path),
-                              open(file_path, 'rb'),
-                              'application/pdf')}
-
-        return self._make_doc_request(['createfromfile'], data='', files=files)
+    def _upload_file_name(self, file_path, file_name):
+        if file_name is not None:
+            return file_name
+        if isinstance(file_path, basestring):
+            return path.basename(file_path)
+        if isinstance(getattr(file_path, 'name', None), basestring):
+            return path.basename(file_path.name)
+        return u'document.pdf'
+
+    def create_document_from_file(self, file_path, file_name=None,
+                                  progress=None):
+        '''
+        Create a document from a PDF file.
 
-    def change_document_file(self, document, file_path):
+        file_path can also be a file object or an iterable of bytes
+        (file_name defaults to its base name or document.pdf). The file
+        is streamed in chunks, never read into memory as a whole.
+        progress(bytes_sent, total_bytes, seconds_elapsed) is called
+        after every chunk, total_bytes is None if the size is unknown.
+        '''
         if file_path is None:
-            files = None
-        else:
-            ascii_file_name = ''.join(c if ord(c) < 128 else '_'
-                                      for c in path.basename(file_path))
-            files = {'file': (ascii_file_name,
-                              open(file_path, 'rb'),
-                              'application/pdf')}
-
-        return self._make_doc_request_invalidate(
-            ['changemainfile', document.id], document, data='', files=files)
+            return self._make_doc_request(['createfromfile'], data='')
+
+        file_name = self._upload_file_name(file_path, file_name)
+        body = _upload.MultipartBody(
+            [('file', file_name, file_path, 'application/pdf')],
+            progress=progress)
+        with contextlib.closing(body):
+            return self._make_doc_request(
+                ['createfromfile'], data=body,
+                headers={'Content-Type': body.content_type})
+
+    def change_document_file(self, document, file_path, file_name=None,
+                             progress=None):
+        if file_path is None:
+            return self._make_doc_request_invalidate(
+                ['changemainfile', document.id], document, data='')
+
+        file_name = self._upload_file_name(file_path, file_name)
+        ascii_file_name = ''.join(c if ord(c) < 128 else '_'
+                                  for c in file_name)
+        body = _upload.MultipartBody(
+            [('file', ascii_file_name, file_path, 'application/pdf')],
+            progress=progress)
+        with contextlib.closing(body):
+            return self._make_doc_request_invalidate(
+                ['changemainfile', document.id], document, data=body,
+                headers={'Content-Type': body.content_type})
 
     def create_document_from_template(self, template_id):
         return self._make_doc_request(['createfromtemplate', template_id])
 
     def get_document(self, document_id):
-        return self._make_doc_request(['get', document_id],
-                                      method=requests.get)
-
-    def update_document(self, document):
-        data = {}
-        files = {}
-        att_count = 0
-        for attachment in document.author_attachments:
-            att_key = u'attachment_' + unicode(att_count)
-            att_details = u'attachment_details_' + unicode(att_count)
-            att_descr = {u'name': attachment.name,
-                         u'required': attachment.mandatory,
-                         u'add_to_sealed_file': attachment.merge}
-
-            if isinstance(attachment, _document.AuthorAttachment):
-                files[att_key] = (attachment.name,
-                                  attachment.stream(),
-                                  'application/pdf')
+        cache = self._document_cache
+        if cache is None:
+            return self._make_doc_request(['get', document_id],
+                                          method=b'GET')
+
+        entry = cache.get(document_id)
+        if entry is not None and cache.is_fresh(entry):
+            return self._document_from_cache(entry)
+
+        headers = None
+        if entry is not None:
+            headers = {b'If-None-Match': _entity_tag(entry.etag,
+                                                     entry.object_version)}
+
+        def parse(response):
+            if response.status_code == 304:
+                new_entry = _cache.CachedDocument(
+                    document_id, entry.content, etag=entry.etag,
+                    object_version=entry.object_version)
             else:
-                att_descr[u'file_id'] = attachment.id
-                data[att_key] = attachment.id
+                json_obj = self._decode_json(response.content)
+                new_entry = _cache.CachedDocument(
+                    document_id, response.content,
+                    etag=response.headers.get('ETag'),
+                    object_version=json_obj.get(u'objectversion'))
+            cache.put(new_entry)
+            return self._document_from_cache(new_entry)
+
+        return self._make_request(['get', document_id], method=b'GET',
+                                  headers=headers, parse=parse)
+
+    def refresh_document(self, document):
+        '''
+        Return up-to-date version of document.
 
-            data[att_details] = json.dumps(att_descr)
-            att_count += 1
+        The request is conditional (If-None-Match with the document's
+        ETag or object version). If the document didn't change on the
+        server, the document itself is returned, without parsing.
+        '''
+        if document._invalid:
+            return self.get_document(document._id)
+
+        etag = _entity_tag(document._etag, document._object_version)
+
+        def parse(response):
+            if response.status_code == 304:
+                return document
+            json_obj = self._decode_json(response.content)
+            etag = response.headers.get('ETag')
+            if json_obj.get(u'objectversion') == document._object_version:
+                # server doesn't support conditional requests,
+                # but the document didn't change anyway
+                if etag is not None:
+                    document._etag = etag
+                return document
+            return self._document_from_json(json_obj, etag)
+
+        return self._make_request(['get', document._id], method=b'GET',
+                                  headers={b'If-None-Match': etag},
+                                  parse=parse)
+
+    def get_documents(self, document_ids, max_workers=None, ordered=True):
+        '''
+        Fetch many documents over a bounded pool of worker threads.
 
-        new_doc = self._make_doc_request(['setattachments', document.id],
-                                         data=data, files=files)
+        Yields (document_id, document, error) tuples, in input order or
+        as they complete (if ordered is False). A failed fetch yields
+        None as document and the exception as error, the rest of the
+        batch is not affected.
+        '''
+        def fetch(document_id):
+            try:
+                return document_id, self.get_document(document_id), None
+            except (_exceptions.Error, requests.RequestException) as e:
+                return document_id, None, e
+
+        return self._map_bounded(fetch, document_ids, max_workers, ordered)
+
+    def _map_bounded(self, fun, items, max_workers, ordered):
+        if max_workers is None:
+            max_workers = self._pool_maxsize
+
+        workers = pool.ThreadPool(max_workers)
+        try:
+            if ordered:
+                results = workers.imap(fun, items)
+            else:
+                results = workers.imap_unordered(fun, items)
+            for result in results:
+                yield result
+            workers.close()
+        finally:
+            workers.terminate()
+            workers.join()
+
+    def download_documents(self, documents, dir_path, sealed=True,
+                           max_workers=None, ordered=True):
+        '''
+        Download sealed documents (or original files, if sealed is
+        False) of documents (Document objects or ids) to dir_path over
+        a bounded pool of worker threads.
+
+        Files are named <document id>_<file name>. A file already
+        present with the same size as on the server isn't downloaded
+        again. Yields (document_id, file_path, status, error) tuples,
+        status is a DownloadStatus.
+        '''
+        claimed_paths = set()
+        lock = threading.Lock()
+
+        def claim_path(file_name):
+            # different files never share a path within one call
+            with lock:
+                file_path = path.join(dir_path, file_name)
+                suffix = 1
+                while file_path in claimed_paths:
+                    suffix += 1
+                    base, ext = path.splitext(file_name)
+                    file_path = path.join(dir_path,
+                                          u'%s_%d%s' % (base, suffix, ext))
+                claimed_paths.add(file_path)
+                return file_path
+
+        def download(document):
+            document_id = file_path = None
+            try:
+                if isinstance(document, basestring):
+                    document_id = document
+                    document = self.get_document(document_id)
+                else:
+                    document_id = document.id
+                if sealed:
+                    file_ = document.sealed_document
+                else:
+                    file_ = document.original_file
+                if file_ is None:
+                    return (document_id, None,
+                            _download.DownloadStatus.missing, None)
+
+                file_path = claim_path(u'%s_%s' % (document_id,
+                                                   path.basename(file_.name)))
+                if (path.isfile(file_path) and
+                        path.getsize(file_path) == file_._remote_size()):
+                    return (document_id, file_path,
+                            _download.DownloadStatus.skipped, None)
+                file_.save_as(file_path)
+                return (document_id, file_path,
+                        _download.DownloadStatus.downloaded, None)
+            except (_exceptions.Error, requests.RequestException,
+                    EnvironmentError) as e:
+                return (document_id, file_path,
+                        _download.DownloadStatus.failed, e)
+
+        return self._map_bounded(download, documents, max_workers, ordered)
+
+    def list_documents(self, statuses=None, tags=None, modified_after=None,
+                       modified_before=None, page_size=100):
+        '''
+        Iterate over the documents of the account matching the filters.
+
+        Documents are fetched page_size at a time. The next page is
+        fetched (and parsed) in the background while the current one is
+        consumed, so at most two pages are held in memory.
+
+        statuses is an iterable of DocumentStatus, tags a dict of tag
+        names and values, modified_after and modified_before are
+        datetimes bounding the modification time.
+
+        The v1 list call returns document summaries, not documents, so
+        this assumes the server answers GET list with the paging and
+        filtering of the later API versions: offset and max parameters,
+        a filter parameter with a JSON list of filter_by objects, and a
+        JSON object with total_matching and a documents list of full
+        document JSON objects.
+        '''
+        filters = []
+        if statuses is not None:
+            filters.append({u'filter_by': u'status',
+                            u'statuses': [_document.DocumentStatus(s).value
+                                          for s in statuses]})
+        if tags:
+            filters.append({u'filter_by': u'tags',
+                            u'value': [{u'name': key, u'value': val}
+                                       for key, val in tags.items()]})
+        if modified_after is not None or modified_before is not None:
+            mtime_filter = {u'filter_by': u'mtime'}
+            if modified_after is not None:
+                mtime_filter[u'start_time'] = modified_after.isoformat()
+            if modified_before is not None:
+                mtime_filter[u'end_time'] = modified_before.isoformat()
+            filters.append(mtime_filter)
+
+        def parse(response):
+            json_obj = self._decode_json(response.content)
+            return (json_obj[u'total_matching'],
+                    [self._document_from_json(doc_json)
+                     for doc_json in json_obj[u'documents']])
+
+        def fetch(offset):
+            params = {b'offset': offset, b'max': page_size,
+                      b'filter': json.dumps(filters)}
+            return self._make_request([b'list'], method=b'GET',
+                                      params=params, parse=parse)
+
+        workers = pool.ThreadPool(1)
+        try:
+            offset = 0
+            page = workers.apply_async(fetch, (offset,))
+            while page is not None:
+                total, documents = page.get()
+                offset += len(documents)
+                if len(documents) == page_size and offset < total:
+                    page = workers.apply_async(fetch, (offset,))
+                else:
+                    page = None
+                for document in documents:
+                    yield document
+            workers.close()
+        finally:
+            workers.terminate()
+            workers.join()
+
+    def _set_attachments(self, document):
+        registry = self._attachment_registry
+        data = []
+        files = []
+        # ids of files already on the server
+        referenced_ids = []
+        # (attachment, content hash or None, hashing reader or None,
+        # file key) of uploaded attachments
+        uploads = []
+        # hashes of attachments referenced by file id from the registry
+        reused = []
+        att_count = 0
+        try:
+            for attachment in document.author_attachments:
+                att_key = u'attachment_' + unicode(att_count)
+                att_details = u'attachment_details_' + unicode(att_count)
+                att_descr = {u'name': attachment.name,
+                             u'required': attachment.mandatory,
+                             u'add_to_sealed_file': attachment.merge}
+
+                file_id = None
+                if isinstance(attachment, _document.AuthorAttachment):
+                    content_hash = None
+                    if registry is not None:
+                        content_hash = registry.content_hash(attachment)
+                    if content_hash is not None:
+                        file_id = registry.get(content_hash)
+                    if file_id is not None:
+                        reused.append(content_hash)
+                    else:
+                        # file backed attachments are opened only now
+                        stream = attachment.stream()
+                        if registry is not None and content_hash is not None:
+                            # already hashed, not hashed again here
+                            uploads.append((attachment, content_hash, None,
+                                            None))
+                        elif registry is not None:
+                            # keyed by the state of the file before it's read
+                            file_key = registry._file_key(attachment)
+                            # hashed as it's uploaded, not in a second pass
+                            stream = _attachment_registry.HashingReader(
+                                stream)
+                            uploads.append((attachment, None, stream,
+                                            file_key))
+                        files.append((att_key, attachment.name, stream,
+                                      'application/pdf'))
+                else:
+                    file_id = attachment.id
+
+                if file_id is not None:
+                    att_descr[u'file_id'] = file_id
+                    data.append((att_key, file_id))
+                    referenced_ids.append(file_id)
+                data.append((att_details, json.dumps(att_descr)))
+                att_count += 1
+
+            # streamed, attachment files aren't read into memory
+            body = _upload.MultipartBody(files, data=data)
+            try:
+                new_doc = self._make_doc_request(
+                    ['setattachments', document.id], data=body,
+                    headers={'Content-Type': body.content_type})
+            except requests.HTTPError:
+                if not reused:
+                    raise
+                new_doc = None
+        finally:
+            for _, _, stream, _ in files:
+                stream.close()
+            self._invalidate_cached(document.id)
+
+        if new_doc is None:
+            # files from the registry may be gone, upload them again
+            for content_hash in reused:
+                registry.discard(content_hash)
+            return self._set_attachments(document)
+
+        if uploads:
+            self._register_uploads(uploads, referenced_ids, new_doc)
         document._author_attachments = new_doc._author_attachments
+        document._saved_attachments = new_doc._saved_attachments
+
+    def _register_uploads(self, uploads, referenced_ids, new_doc):
+        # new files are told apart by name, ambiguous ones are skipped
+        new_files = {}
+        for attachment in new_doc.author_attachments:
+            if attachment.id not in referenced_ids:
+                new_files.setdefault(attachment.name, []).append(
+                    attachment.id)
+        names = [upload[0].name for upload in uploads]
+        for attachment, content_hash, reader, file_key in uploads:
+            if reader is not None:
+                content_hash = reader.hexdigest()
+            file_ids = new_files.get(attachment.name, [])
+            if (content_hash is not None and len(file_ids) == 1 and
+                    names.count(attachment.name) == 1):
+                self._attachment_registry._uploaded(
+                    attachment, content_hash, file_ids[0], file_key)
 
+    def update_document(self, document):
+        '''
+        Save document and return its new version. An unmodified
+        document is returned as is, without any request.
+        '''
+        if not document.is_dirty():
+            return document
+        # unchanged attachments don't have to be set (and uploaded) again
+        if document._attachments_changed():
+            self._set_attachments(document)
         return self._make_doc_request_invalidate(
             ['update', document.id], document,
-            data={'json': document._to_json()})
+            data={'json': document._to_json()}, compress=True)
+
+    def send_document(self, file_path=None, template_id=None, prepare=None,
+                      timings=None):
+        '''
+        Create a document (from template_id if given, from file_path
+        otherwise), let prepare(document) modify it, save it and make
+        it ready for signing. Return the ready document.
+
+        setattachments and update are skipped when prepare didn't change
+        the attachments or the rest of the document, and the update
+        response isn't parsed. If timings is a dict, the duration of
+        each stage made (create, setattachments, update, ready) is
+        stored in it.
+
+        If prepare or saving the document raises, the draft is deleted
+        (best effort) before the exception propagates. A document whose
+        ready failed is left alone, as it may have been sent already.
+        '''
+        if (file_path is None) == (template_id is None):
+            raise ValueError(u'exactly one of file_path and template_id '
+                             u'must be given')
+        if timings is None:
+            timings = {}
+
+        start = time.time()
+        if template_id is not None:
+            document = self.create_document_from_template(template_id)
+        else:
+            document = self.create_document_from_file(file_path)
+        timings['create'] = time.time() - start
+
+        if prepare is not None:
+            document_id = document.id
+            try:
+                prepare(document)
+
+                if document._attachments_changed():
+                    start = time.time()
+                    self._set_attachments(document)
+                    timings['setattachments'] = time.time() - start
+                # attachments set above are clean already
+                if document.is_dirty():
+                    start = time.time()
+                    self._make_request(['update', document.id],
+                                       data={'json': document._to_json()},
+                                       compress=True)
+                    document._set_clean()
+                    timings['update'] = time.time() - start
+            except Exception:
+                exc_info = sys.exc_info()
+                self._discard_draft(document_id)
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+        start = time.time()
+        result = self.ready(document)
+        timings['ready'] = time.time() - start
+        return result
+
+    def _discard_draft(self, document_id):
+        try:
+            for endpoint in ('delete', 'reallydelete'):
+                self._make_request([endpoint, document_id], method=b'DELETE')
+        except Exception:
+            # the original error matters more
+            pass
+        finally:
+            self._invalidate_cached(document_id)
 
     def ready(self, document):
         return self._make_doc_request_invalidate(['ready', document.id],
@@ -167,8 +857,11 @@ class Scrive(object):
     def trash_document(self, document):
         if document.status is _document.DocumentStatus.pending:
             document = self._cancel_document(document)
-        result = self._make_request(['delete', document.id],
-                                    method=requests.delete)
+        try:
+            result = self._make_request(['delete', document.id],
+                                        method=b'DELETE')
+        finally:
+            self._invalidate_cached(document._id)
         document._set_invalid()
         return result
 
@@ -176,7 +869,10 @@ class Scrive(object):
         doc_id = document.id
         if document.deletion_status is not _document.DeletionStatus.in_trash:
             self.trash_document(document)
-        self._make_request(['reallydelete', doc_id], method=requests.delete)
+        try:
+            self._make_request(['reallydelete', doc_id], method=b'DELETE')
+        finally:
+            self._invalidate_cached(doc_id)
         if not document._invalid:
             document._set_invalid()
 
@@ -272,6 +272,17 @@ class ScriveSet(set, _object.ScriveObject):
                 item._set_invalid()
         super(ScriveSet, self)._set_invalid()
 
+    def _is_dirty(self):
+        return self._dirty or any(
+            item._is_dirty() for item in set.__iter__(self)
+            if isinstance(item, _object.ScriveObject))
+
+    def _set_clean(self):
+        for item in set.__iter__(self):
+            if isinstance(item, _object.ScriveObject):
+                item._set_clean()
+        super(ScriveSet, self)._set_clean()
+
     @tvu(other=tvu.instance(set))
     def __rxor__(self, other):
         self._check_getter()
@@ -211,6 +211,15 @@ class Signatory(_object.ScriveObject):
         self.fields._set_read_only()
         self.attachments._set_read_only()
 
+    def _is_dirty(self):
+        return (self._dirty or self._fields._is_dirty() or
+                self._attachments._is_dirty())
+
+    def _set_clean(self):
+        self._fields._set_clean()
+        self._attachments._set_clean()
+        super(Signatory, self)._set_clean()
+
     def _set_api(self, api, document):
         super(Signatory, self)._set_api(api, document)
         for attachment in self.attachments:
@@ -0,0 +1,63 @@
+import sys
+import threading
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    '''
+    Coalesces concurrent calls with the same key into one call, whose
+    result (or exception) is shared by all callers.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fun):
+        '''
+        Call fun, unless a call with the same key is already in flight.
+        Return (result, shared), shared is True if the result came from
+        the call of another thread.
+        '''
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+            return call.result, True
+
+        try:
+            call.result = fun()
+        except Exception:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                # may have been forgotten and replaced already
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def forget(self, predicate):
+        '''
+        Make calls with keys matching predicate start anew instead of
+        joining the ones in flight (which still complete for their
+        callers), e.g. when their result may be outdated.
+        '''
+        with self._lock:
+            for key in [key for key in self._calls if predicate(key)]:
+                del self._calls[key]
@@ -0,0 +1,200 @@
+import os
+import time
+import uuid
+
+from requests.packages.urllib3 import fields
+
+from scrivepy import _exceptions
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Source(object):
+    '''
+    Chunked reader over a file path, file object or iterable of bytes.
+    Files opened here are closed as soon as they are read to the end.
+    '''
+
+    def __init__(self, source):
+        self._source = source
+        self._file = None
+        self._iterator = None
+        self._start = None
+        self._pending = b''
+        self.size = None
+
+        if isinstance(source, basestring):
+            self.size = os.path.getsize(source)
+        elif hasattr(source, 'read'):
+            try:
+                self._start = source.tell()
+                source.seek(0, os.SEEK_END)
+                self.size = source.tell() - self._start
+                source.seek(self._start)
+            except (AttributeError, IOError, OSError):
+                self._start = None
+
+    @property
+    def rewindable(self):
+        return (isinstance(self._source, basestring) or
+                self._start is not None)
+
+    def rewind(self):
+        self.close()
+        self._pending = b''
+        self._iterator = None
+        if self._start is not None:
+            self._source.seek(self._start)
+
+    def read(self, size):
+        if isinstance(self._source, basestring):
+            if self._file is None:
+                self._file = open(self._source, 'rb')
+            data = self._file.read(size)
+            if not data:
+                self.close()
+            return data
+        if hasattr(self._source, 'read'):
+            return self._source.read(size)
+
+        # iterables yield chunks of arbitrary size
+        if self._iterator is None:
+            self._iterator = iter(self._source)
+        while len(self._pending) < size:
+            try:
+                self._pending += next(self._iterator)
+            except StopIteration:
+                break
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class MultipartBody(object):
+    '''
+    multipart/form-data request body streamed in chunk_size pieces, so
+    files are never held in memory.
+
+    files is a list of (field name, file name, source, content type)
+    tuples, source being a file path, file object or iterable of bytes.
+    data is a list of (field name, value) pairs sent before the files.
+    The body has a length (and is sent with Content-Length) if the
+    sizes of all sources can be determined, otherwise it's sent
+    chunked.
+
+    progress, if given, is called after each chunk with bytes sent so
+    far, total bytes (or None) and seconds elapsed since the first one.
+    '''
+
+    def __init__(self, files, data=(), progress=None, chunk_size=CHUNK_SIZE):
+        self._boundary = uuid.uuid4().hex
+        # bytes and _Source objects, sent in order
+        self._parts = []
+        self._sources = []
+        for field_name, value in data:
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            self._parts.append(self._head(field_name) + value + b'\r\n')
+        for field_name, file_name, source, content_type in files:
+            self._parts.append(self._head(field_name, file_name,
+                                          content_type))
+            source = _Source(source)
+            self._sources.append(source)
+            self._parts.append(source)
+            self._parts.append(b'\r\n')
+        self._parts.append(b'--%s--\r\n' % (self._boundary,))
+        self._progress = progress
+        self._chunk_size = chunk_size
+        self._sent = 0
+        self.rewind()
+
+    def _head(self, field_name, file_name=None, content_type=None):
+        disposition = fields.format_header_param('name', field_name)
+        if file_name is not None:
+            # non-ascii file names are encoded as in RFC 2231
+            disposition += u'; ' + fields.format_header_param('filename',
+                                                              file_name)
+        head = (u'--%s\r\nContent-Disposition: form-data; %s\r\n'
+                % (self._boundary, disposition))
+        if content_type is not None:
+            head += u'Content-Type: %s\r\n' % (content_type,)
+        return (head + u'\r\n').encode('ascii')
+
+    @property
+    def content_type(self):
+        return b'multipart/form-data; boundary=%s' % (self._boundary,)
+
+    @property
+    def len(self):
+        # requests sends bodies without len chunked
+        size = self._size()
+        if size is None:
+            raise AttributeError('len')
+        return size
+
+    def _size(self):
+        size = 0
+        for part in self._parts:
+            if isinstance(part, bytes):
+                size += len(part)
+            elif part.size is None:
+                return None
+            else:
+                size += part.size
+        return size
+
+    def rewind(self):
+        '''
+        Prepare to be sent again (when the request is retried).
+        '''
+        if self._sent and not all(source.rewindable
+                                  for source in self._sources):
+            raise _exceptions.Error(u"Can't resend upload from an iterable")
+        for source in self._sources:
+            source.rewind()
+        self._buffer = b''
+        self._part_index = 0
+        self._sent = 0
+        self._start_time = None
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(self))
+        while len(self._buffer) < size and self._part_index < len(self._parts):
+            part = self._parts[self._part_index]
+            if isinstance(part, bytes):
+                self._buffer += part
+                self._part_index += 1
+                continue
+            data = part.read(max(size - len(self._buffer), self._chunk_size))
+            if data:
+                self._buffer += data
+            else:
+                self._part_index += 1
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._report(len(data))
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self._chunk_size)
+            if not data:
+                return
+            yield data
+
+    def _report(self, size):
+        if self._start_time is None:
+            self._start_time = time.time()
+        self._sent += size
+        if self._progress is not None and size:
+            self._progress(self._sent, self._size(),
+                           time.time() - self._start_time)
+
+    def close(self):
+        for source in self._sources:
+            source.close()
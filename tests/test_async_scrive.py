@@ -0,0 +1,58 @@
+import json
+import threading
+import time
+
+from scrivepy import AsyncScrive, Document, InvalidResponse
+from tests import utils
+
+
+class AsyncScriveTest(utils.TestCase):
+
+    def test_calls_run_concurrently(self):
+        lock = threading.Lock()
+        state = {'in_flight': 0, 'max_in_flight': 0}
+
+        def get(request):
+            with lock:
+                state['in_flight'] += 1
+                state['max_in_flight'] = max(state['max_in_flight'],
+                                             state['in_flight'])
+            time.sleep(.1)
+            with lock:
+                state['in_flight'] -= 1
+            doc_json = utils.document_json(id=request.args[0])
+            return 200, {}, json.dumps(doc_json)
+
+        with utils.StubServer() as server:
+            server.on('get', get)
+            with server.api(api_class=AsyncScrive, max_workers=5) as api:
+                results = [api.get_document(unicode(i)) for i in range(10)]
+                docs = [result.get() for result in results]
+
+        self.assertEqual([d.id for d in docs],
+                         [unicode(i) for i in range(10)])
+        self.assertTrue(all(isinstance(d, Document) for d in docs))
+        self.assertEqual(state['max_in_flight'], 5)
+
+    def test_rate_limiter_settings(self):
+        with utils.StubServer() as server:
+            with server.api(api_class=AsyncScrive, max_workers=5,
+                            max_in_flight=2) as api:
+                self.assertEqual(api.scrive.rate_limiter.max_in_flight, 2)
+
+    def test_errors_are_reraised(self):
+        with utils.StubServer() as server:
+            server.on('get', lambda request: (200, {}, b'{}'))
+            with server.api(api_class=AsyncScrive) as api:
+                result = api.get_document(u'1234')
+                with self.assertRaises(InvalidResponse):
+                    result.get()
+
+    def test_get_file_bytes(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on('downloadfile', lambda request: (200, {}, b'pdf'))
+            with server.api(api_class=AsyncScrive) as api:
+                d = api.get_document(u'1234').get()
+                result = api.get_file_bytes(d.original_file)
+                self.assertEqual(result.get(), b'pdf')
@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+import time
+
+from scrivepy import DiskDocumentCache, DocumentCache, _cache
+from tests import utils
+
+
+CD = _cache.CachedDocument
+
+
+class DocumentCacheTest(utils.TestCase):
+
+    def test_get_put(self):
+        cache = DocumentCache()
+        self.assertIsNone(cache.get(u'1'))
+        entry = CD(u'1', b'{}', etag=b'"a"', object_version=3)
+        cache.put(entry)
+        self.assertIs(cache.get(u'1'), entry)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, 2)
+
+        entry2 = CD(u'1', b'{"a": 1}')
+        cache.put(entry2)
+        self.assertIs(cache.get(u'1'), entry2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, 8)
+
+    def test_max_entries(self):
+        cache = DocumentCache(max_entries=2)
+        cache.put(CD(u'1', b'1'))
+        cache.put(CD(u'2', b'2'))
+        cache.get(u'1')  # 2 is now least recently used
+        cache.put(CD(u'3', b'3'))
+        self.assertIsNotNone(cache.get(u'1'))
+        self.assertIsNone(cache.get(u'2'))
+        self.assertIsNotNone(cache.get(u'3'))
+
+        with self.assertRaises(ValueError, u'max_entries must be at least 1'):
+            DocumentCache(max_entries=0)
+
+    def test_max_bytes(self):
+        cache = DocumentCache(max_bytes=10)
+        cache.put(CD(u'1', b'1234'))
+        cache.put(CD(u'2', b'1234'))
+        cache.put(CD(u'3', b'1234'))
+        self.assertIsNone(cache.get(u'1'))
+        self.assertEqual(cache.size, 8)
+
+        # too big to be cached at all
+        cache.put(CD(u'2', b'x' * 11))
+        self.assertIsNone(cache.get(u'2'))
+        self.assertEqual(cache.size, 4)
+
+    def test_ttl(self):
+        cache = DocumentCache(ttl=10)
+        self.assertTrue(cache.is_fresh(CD(u'1', b'')))
+        self.assertFalse(cache.is_fresh(CD(u'1', b'',
+                                           fetch_time=time.time() - 11)))
+        self.assertTrue(DocumentCache().is_fresh(CD(u'1', b'',
+                                                    fetch_time=0)))
+
+    def test_invalidate(self):
+        cache = DocumentCache()
+        cache.put(CD(u'1', b'1'))
+        cache.put(CD(u'2', b'2'))
+        cache.invalidate(u'1')
+        cache.invalidate(u'3')
+        self.assertIsNone(cache.get(u'1'))
+        self.assertEqual(cache.size, 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+
+def _fill_disk_cache(args):
+    file_path, worker = args
+    cache = DiskDocumentCache(file_path)
+    for i in range(20):
+        cache.put(CD(u'%d-%d' % (worker, i), b'x' * 10))
+        cache.get(u'%d-%d' % ((worker + 1) % 4, i))
+    cache.close()
+
+
+class DiskDocumentCacheTest(utils.TestCase):
+
+    def test_persistence(self):
+        with utils.temporary_dir() as dir_path:
+            file_path = os.path.join(dir_path, 'cache.db')
+            cache = DiskDocumentCache(file_path)
+            self.assertIsNone(cache.get(u'1'))
+            cache.put(CD(u'1', b'{}', etag=b'"a"', object_version=3,
+                         fetch_time=1000.))
+            cache.close()
+
+            cache = DiskDocumentCache(file_path)
+            entry = cache.get(u'1')
+            self.assertEqual(entry.document_id, u'1')
+            self.assertEqual(entry.content, b'{}')
+            self.assertEqual(entry.etag, b'"a"')
+            self.assertEqual(entry.object_version, 3)
+            self.assertEqual(entry.fetch_time, 1000.)
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(cache.size, 2)
+
+            cache.invalidate(u'1')
+            self.assertIsNone(cache.get(u'1'))
+            cache.put(CD(u'2', b'{}'))
+            cache.clear()
+            self.assertEqual(len(cache), 0)
+
+    def test_max_bytes(self):
+        with utils.temporary_dir() as dir_path:
+            file_path = os.path.join(dir_path, 'cache.db')
+            cache = DiskDocumentCache(file_path, max_bytes=10)
+            cache.put(CD(u'1', b'1234'))
+            time.sleep(.01)
+            cache.put(CD(u'2', b'1234'))
+            time.sleep(.01)
+            cache.get(u'1')  # 2 is now least recently used
+            time.sleep(.01)
+            cache.put(CD(u'3', b'1234'))
+            self.assertIsNotNone(cache.get(u'1'))
+            self.assertIsNone(cache.get(u'2'))
+            self.assertEqual(cache.size, 8)
+
+            cache.put(CD(u'1', b'x' * 11))
+            self.assertIsNone(cache.get(u'1'))
+            self.assertEqual(cache.size, 4)
+
+    def test_running_size(self):
+        with utils.temporary_dir() as dir_path:
+            file_path = os.path.join(dir_path, 'cache.db')
+            cache = DiskDocumentCache(file_path)
+            cache.put(CD(u'1', b'1234'))
+            cache.put(CD(u'2', b'12'))
+            cache.put(CD(u'1', b'1'))
+            self.assertEqual(cache.size, 3)
+            cache.invalidate(u'2')
+            cache.invalidate(u'3')
+            self.assertEqual(cache.size, 1)
+
+            # reads don't write, access times are saved with the next write
+            conn = cache._connection()
+            access_time, = conn.execute(
+                u'SELECT access_time FROM documents').fetchone()
+            time.sleep(.01)
+            cache.get(u'1')
+            self.assertEqual(conn.execute(
+                u'SELECT access_time FROM documents').fetchone()[0],
+                access_time)
+            cache.put(CD(u'2', b'12'))
+            self.assertGreater(conn.execute(
+                u'''SELECT access_time FROM documents
+                   WHERE document_id = ?''', (u'1',)).fetchone()[0],
+                access_time)
+            cache.close()
+
+            self.assertEqual(DiskDocumentCache(file_path).size, 3)
+
+    def test_concurrent_processes(self):
+        with utils.temporary_dir() as dir_path:
+            file_path = os.path.join(dir_path, 'cache.db')
+            DiskDocumentCache(file_path).close()
+            workers = multiprocessing.Pool(4)
+            try:
+                workers.map(_fill_disk_cache,
+                            [(file_path, i) for i in range(4)])
+            finally:
+                workers.close()
+                workers.join()
+            cache = DiskDocumentCache(file_path)
+            self.assertEqual(len(cache), 80)
+            self.assertEqual(cache.size, 800)
@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+import urllib
+
+import requests
+
+from scrivepy import CallbackReceiver, CallbackServer, Document, \
+    InvalidResponse
+from scrivepy import _callback
+from tests import utils
+
+
+class ParseCallbackTest(utils.TestCase):
+
+    def test_form(self):
+        body = urllib.urlencode(
+            {b'documentid': b'1234',
+             b'documentjson': json.dumps(utils.document_json())})
+        document = _callback.parse_callback(
+            body, b'application/x-www-form-urlencoded')
+        self.assertIsInstance(document, Document)
+        self.assertEqual(document.id, u'1234')
+
+    def test_json(self):
+        body = json.dumps(utils.document_json(id=u'42'))
+        document = _callback.parse_callback(
+            body, b'application/json; charset=utf-8')
+        self.assertEqual(document.id, u'42')
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidResponse):
+            _callback.parse_callback(b'documentjson=nope')
+        with self.assertRaises(InvalidResponse):
+            _callback.parse_callback(b'{}', b'application/json')
+
+    def test_bound_to_api(self):
+        with utils.StubServer() as server:
+            api = server.api()
+            body = json.dumps(utils.document_json())
+            document = _callback.parse_callback(body, api=api)
+            self.assertIs(document._api, api)
+
+
+class CallbackServerTest(utils.TestCase):
+
+    def _post(self, server, document_id=u'1234'):
+        data = {b'documentid': document_id,
+                b'documentjson': json.dumps(
+                    utils.document_json(id=document_id))}
+        return requests.post(server.url, data=data)
+
+    def _wait_until(self, condition):
+        deadline = time.time() + 5
+        while not condition() and time.time() < deadline:
+            time.sleep(.01)
+        self.assertTrue(condition())
+
+    def test_delivery(self):
+        received = []
+        receiver = CallbackReceiver(received.append, workers=2)
+        with CallbackServer(receiver, host=b'127.0.0.1') as server:
+            self.assertIs(server.receiver, receiver)
+            for i in range(5):
+                self.assertEqual(self._post(server, unicode(i)).status_code,
+                                 200)
+            receiver.join()
+        self.assertEqual(sorted(document.id for document in received),
+                         [u'0', u'1', u'2', u'3', u'4'])
+
+    def test_bad_requests(self):
+        receiver = CallbackReceiver(lambda document: None)
+        with CallbackServer(receiver, host=b'127.0.0.1') as server:
+            self.assertEqual(requests.get(server.url).status_code, 405)
+            response = requests.post(server.url, data={b'documentid': b'1'})
+            self.assertEqual(response.status_code, 400)
+
+        receiver = CallbackReceiver(lambda document: None, max_body_size=10)
+        with CallbackServer(receiver, host=b'127.0.0.1') as server:
+            self.assertEqual(self._post(server).status_code, 400)
+
+    def test_full_queue(self):
+        release = threading.Event()
+        received = []
+
+        def handler(document):
+            release.wait()
+            received.append(document.id)
+
+        receiver = CallbackReceiver(handler, queue_size=1)
+        with CallbackServer(receiver, host=b'127.0.0.1') as server:
+            self.assertEqual(self._post(server, u'1').status_code, 200)
+            # first document is taken by the worker, second one waits
+            self._wait_until(lambda: receiver.pending == 0)
+            self.assertEqual(self._post(server, u'2').status_code, 200)
+            response = self._post(server, u'3')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], b'60')
+            release.set()
+        self.assertEqual(received, [u'1', u'2'])
+
+    def test_handler_error(self):
+        errors = []
+
+        def handler(document):
+            raise ValueError(document.id)
+
+        receiver = CallbackReceiver(
+            handler,
+            error_handler=lambda document, exc_info: errors.append(exc_info))
+        with CallbackServer(receiver, host=b'127.0.0.1') as server:
+            self._post(server)
+            self._post(server)
+            receiver.join()
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0][0], ValueError)
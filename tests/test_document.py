@@ -7,6 +7,8 @@ import pyPdf
 
 from scrivepy import (
     AuthorAttachment as AA,
+    FileAuthorAttachment as FAA,
+    MmapAuthorAttachment as MAA,
     Signatory as S,
     Document as D,
     DocumentStatus as DS,
@@ -129,6 +131,68 @@ class AuthorAttachmentTest(utils.IntegrationTestCase):
             aa.merge
 
 
+class FileAuthorAttachmentTest(utils.TestCase):
+
+    O = FAA
+
+    @contextlib.contextmanager
+    def _file_path(self, content):
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(content)
+            yield file_path
+
+    def test_lazy(self):
+        with self._file_path(b'old') as file_path:
+            file_ = self.O(file_path)
+            self.assertIsNone(file_._content)
+            with open(file_path, 'wb') as f:
+                f.write(b'new content')
+            with contextlib.closing(file_.stream()) as s:
+                self.assertEqual(s.read(), b'new content')
+            self.assertEqual(list(file_.iter_chunks(4)),
+                             [b'new ', b'cont', b'ent'])
+
+    def test_empty(self):
+        with self._file_path(b'') as file_path:
+            self.assertEqual(self.O(file_path).get_bytes(), b'')
+
+    def test_name(self):
+        with self._file_path(b'') as file_path:
+            file_ = self.O(file_path)
+            self.assertEqual(file_.name, os.path.basename(file_path))
+            self.assertEqual(file_.file_path, file_path)
+            self.assertEqual(self.O(file_path, name=u'a.pdf').name, u'a.pdf')
+            self.assertIsInstance(file_, AA)
+
+        with self.assertRaises(TypeError,
+                               u'file_path must be unicode or str, not None'):
+            self.O(None)
+
+        with self.assertRaises(ValueError,
+                               u'name must be None or non-empty string'):
+            self.O(u'a.pdf', name=u'')
+
+    def test_mandatory_merge(self):
+        with self.assertRaises(TypeError, u'mandatory must be bool, not 2'):
+            self.O(u'a.pdf', mandatory=2)
+
+        with self.assertRaises(TypeError, u'merge must be bool, not 2'):
+            self.O(u'a.pdf', merge=2)
+
+        file_ = self.O(u'a.pdf', mandatory=True, merge=False)
+        self.assertTrue(file_.mandatory)
+        self.assertFalse(file_.merge)
+        file_._set_read_only()
+        with self.assertRaises(ReadOnlyScriveObject):
+            file_.merge = True
+
+
+class MmapAuthorAttachmentTest(FileAuthorAttachmentTest):
+
+    O = MAA
+
+
 class RemoteAuthorAttachmentTest(utils.IntegrationTestCase):
 
     @utils.integration
@@ -1025,6 +1089,40 @@ class DocumentTest(utils.IntegrationTestCase):
         with self.assertRaises(InvalidScriveObject, None):
             list(d.other_signatories())
 
+    def test_is_dirty(self):
+        placement_json = {u'xrel': .1, u'yrel': .2, u'wrel': .3,
+                          u'hrel': .4, u'fsrel': .05, u'page': 1,
+                          u'tip': u'left'}
+        field_json = {u'type': u'custom', u'name': u'field',
+                      u'value': u'', u'closed': False,
+                      u'obligatory': True, u'shouldbefilledbysender': False,
+                      u'placements': [placement_json]}
+        json = utils.document_json(
+            signatories=[utils.signatory_json(fields=[field_json])])
+
+        def modifications(d):
+            yield lambda: setattr(d, 'title', u'new title')
+            yield lambda: d.tags.update(key=u'val')
+            yield lambda: d.author_attachments.add(AA(u'a.pdf', b''))
+            yield lambda: setattr(d.author, 'viewer', True)
+            field, = d.author.fields
+            yield lambda: setattr(field, 'value', u'value')
+            placement, = field.placements
+            yield lambda: setattr(placement, 'page', 2)
+            yield lambda: d.author.fields.clear()
+
+        for i in range(7):
+            d = D._from_json_obj(json)
+            self.assertFalse(d.is_dirty())
+            list(modifications(d))[i]()
+            self.assertTrue(d.is_dirty())
+            d._set_clean()
+            self.assertFalse(d.is_dirty())
+
+        d._set_invalid()
+        with self.assertRaises(InvalidScriveObject, None):
+            d.is_dirty()
+
     def test_private_ctor(self):
         msg = u'Dont create Document objects directly. Use Scrive object.'
         with self.assertRaises(TypeError, msg):
@@ -0,0 +1,212 @@
+import json
+import os
+import re
+import threading
+
+import requests
+
+from scrivepy import DownloadStatus as DS, Error, InvalidScriveObject, \
+    RetryPolicy, _download
+from tests import utils
+
+
+CONTENT = b''.join(b'%06d\n' % (i,) for i in range(50000))
+
+
+class RangeServer(object):
+    '''
+    downloadfile handler supporting Range requests, which drops the
+    connection after drop_after bytes of the first drops responses.
+    '''
+
+    def __init__(self, content=CONTENT, drops=0, drop_after=100000,
+                 ranges=True):
+        self.content = content
+        self.drops = drops
+        self.drop_after = drop_after
+        self.ranges = ranges
+        self.range_headers = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        content = self.content
+        status, headers, start = 200, {}, 0
+        range_header = request.headers.get('range')
+        with self._lock:
+            self.range_headers.append(range_header)
+            drop = self.drops > 0
+            self.drops -= drop
+        if range_header is not None and self.ranges:
+            first, last = re.match(r'bytes=(\d+)-(\d*)$',
+                                   range_header).groups()
+            start = int(first)
+            end = int(last) + 1 if last else len(content)
+            headers['Content-Range'] = b'bytes %d-%d/%d' % (
+                start, end - 1, len(content))
+            status, content = 206, content[start:end]
+        if drop:
+            headers['Content-Length'] = str(len(content))
+            content = content[:self.drop_after]
+        return status, headers, content
+
+
+class DownloadTest(utils.TestCase):
+
+    def _document(self, server, handler, **kwargs):
+        server.on_document('get')
+        server.on('downloadfile', handler)
+        api = server.api(retry_policy=RetryPolicy(backoff_factor=0.),
+                         **kwargs)
+        return api.get_document(u'1234')
+
+    def test_stream_resumes(self):
+        handler = RangeServer(drops=2)
+        with utils.StubServer() as server:
+            d = self._document(server, handler)
+            self.assertEqual(d.original_file.stream().read(), CONTENT)
+        self.assertEqual(handler.range_headers,
+                         [None, 'bytes=100000-349999',
+                          'bytes=200000-349999'])
+
+    def test_server_ignoring_ranges(self):
+        handler = RangeServer(drops=1, ranges=False)
+        with utils.StubServer() as server:
+            d = self._document(server, handler)
+            self.assertEqual(d.original_file.stream().read(), CONTENT)
+
+    def test_save_as(self):
+        handler = RangeServer(drops=1)
+        with utils.StubServer() as server:
+            d = self._document(server, handler)
+            with utils.temporary_dir() as dir_path:
+                file_path = os.path.join(dir_path, 'a.pdf')
+                umask = os.umask(0o022)
+                try:
+                    d.original_file.save_as(file_path)
+                finally:
+                    os.umask(umask)
+                with open(file_path, 'rb') as f:
+                    self.assertEqual(f.read(), CONTENT)
+                self.assertEqual(os.listdir(dir_path), ['a.pdf'])
+                self.assertEqual(os.stat(file_path).st_mode & 0o777, 0o644)
+
+    def test_save_as_fails_atomically(self):
+        handler = RangeServer(drops=10, drop_after=0)
+        with utils.StubServer() as server:
+            d = self._document(server, handler)
+            with utils.temporary_dir() as dir_path:
+                file_path = os.path.join(dir_path, 'a.pdf')
+                with open(file_path, 'wb') as f:
+                    f.write(b'old')
+                with self.assertRaises(Error, None):
+                    d.original_file.save_as(file_path)
+                with open(file_path, 'rb') as f:
+                    self.assertEqual(f.read(), b'old')
+                self.assertEqual(os.listdir(dir_path), ['a.pdf'])
+
+    def test_parallel_ranges(self):
+        handler = RangeServer(drops=1)
+        with utils.StubServer() as server:
+            d = self._document(server, handler)
+            with utils.temporary_dir() as dir_path:
+                file_path = os.path.join(dir_path, 'a.pdf')
+                _download.save_as(d._api, d.original_file._url_elems(),
+                                  file_path, max_workers=4,
+                                  parallel_threshold=1000)
+                with open(file_path, 'rb') as f:
+                    self.assertEqual(f.read(), CONTENT)
+        # first range is read from the first response
+        self.assertEqual(sorted(handler.range_headers[1:]),
+                         ['bytes=175000-262499', 'bytes=262500-349999',
+                          'bytes=87500-174999'])
+
+    def test_parallel_resumes(self):
+        handler = RangeServer(drops=4, drop_after=1000)
+        with utils.StubServer() as server:
+            d = self._document(server, handler)
+            with utils.temporary_dir() as dir_path:
+                file_path = os.path.join(dir_path, 'a.pdf')
+                _download.save_as(d._api, d.original_file._url_elems(),
+                                  file_path, max_workers=4,
+                                  parallel_threshold=1000)
+                with open(file_path, 'rb') as f:
+                    self.assertEqual(f.read(), CONTENT)
+
+
+class DownloadDocumentsTest(utils.TestCase):
+
+    def _get(self, request):
+        doc_id = request.args[0]
+        if doc_id == u'missing':
+            return 404, {}, b'not found'
+        sealed = None
+        if doc_id != u'unsealed':
+            sealed = {u'id': u'9' + doc_id, u'name': u'signed.pdf'}
+        return 200, {}, json.dumps(utils.document_json(id=doc_id,
+                                                       sealedfile=sealed))
+
+    def _download(self, request):
+        return 200, {}, b'sealed ' + request.args[0]
+
+    def test_download(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get)
+            server.on('downloadfile', self._download)
+            api = server.api()
+            doc = api.get_document(u'2')
+            with utils.temporary_dir() as dir_path:
+                with open(os.path.join(dir_path, u'3_signed.pdf'), 'wb') as f:
+                    f.write(b'sealed 3')
+                with open(os.path.join(dir_path, u'4_signed.pdf'), 'wb') as f:
+                    f.write(b'partial')
+                ids = [u'1', doc, u'3', u'4', u'1', u'unsealed', u'missing']
+                results = list(api.download_documents(ids, dir_path,
+                                                      max_workers=3))
+
+                contents = {}
+                for file_name in os.listdir(dir_path):
+                    with open(os.path.join(dir_path, file_name), 'rb') as f:
+                        contents[file_name] = f.read()
+
+        self.assertEqual([(doc_id, status)
+                          for doc_id, _, status, _ in results],
+                         [(u'1', DS.downloaded), (u'2', DS.downloaded),
+                          (u'3', DS.skipped), (u'4', DS.downloaded),
+                          (u'1', DS.downloaded), (u'unsealed', DS.missing),
+                          (u'missing', DS.failed)])
+        self.assertEqual(sorted(os.path.basename(file_path)
+                                for _, file_path, _, _ in results[:5]),
+                         [u'1_signed.pdf', u'1_signed_2.pdf',
+                          u'2_signed.pdf', u'3_signed.pdf', u'4_signed.pdf'])
+        self.assertEqual(contents, {u'1_signed.pdf': b'sealed 1',
+                                    u'1_signed_2.pdf': b'sealed 1',
+                                    u'2_signed.pdf': b'sealed 2',
+                                    u'3_signed.pdf': b'sealed 3',
+                                    u'4_signed.pdf': b'sealed 4'})
+        self.assertIsInstance(results[-1][3], requests.HTTPError)
+
+    def test_original_files(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get)
+            server.on('downloadfile', self._download)
+            api = server.api()
+            with utils.temporary_dir() as dir_path:
+                (_, file_path, status, _), = api.download_documents(
+                    [u'1'], dir_path, sealed=False)
+                self.assertEqual(status, DS.downloaded)
+                self.assertEqual(os.path.basename(file_path),
+                                 u'1_document.pdf')
+
+    def test_invalid_document(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get)
+            server.on('downloadfile', self._download)
+            api = server.api()
+            doc = api.get_document(u'2')
+            doc._set_invalid()
+            with utils.temporary_dir() as dir_path:
+                results = list(api.download_documents([doc, u'1'], dir_path))
+        self.assertEqual([(doc_id, status)
+                          for doc_id, _, status, _ in results],
+                         [(None, DS.failed), (u'1', DS.downloaded)])
+        self.assertIsInstance(results[0][3], InvalidScriveObject)
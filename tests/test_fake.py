@@ -0,0 +1,163 @@
+import os
+
+import requests
+
+from scrivepy import (
+    AuthorAttachment as AA,
+    DocumentStatus as DS,
+    DeletionStatus as DelS,
+    FakeScrive,
+    FakeScriveServer,
+    Signatory
+)
+from tests import utils
+
+
+PDF_PATH = os.path.join(os.path.dirname(__file__), 'document.pdf')
+
+
+class FakeScriveTest(utils.TestCase):
+
+    def setUp(self):
+        self.now = 1464782400.
+        self.fake = FakeScrive(clock=lambda: self.now)
+        self.api = self.fake.api()
+        with open(PDF_PATH, 'rb') as f:
+            self.pdf = f.read()
+
+    def _prepared(self):
+        d = self.api.create_document_from_file(PDF_PATH)
+        d.title = u'contract'
+        d.signatories.add(Signatory())
+        return self.api.update_document(d)
+
+    def test_create(self):
+        d = self.api.create_document_from_file(PDF_PATH)
+        self.assertEqual(d.status, DS.preparation)
+        self.assertEqual(d.title, u'document')
+        self.assertFalse(d.saved_as_draft)
+        self.assertEqual(d.original_file.name, u'document.pdf')
+        self.assertEqual(d.original_file.get_bytes(), self.pdf)
+        self.assertEqual(len(d.signatories), 1)
+        self.assertEqual(self.fake.request_count, 2)
+
+        d2 = self.api.create_document_from_file(None)
+        self.assertIsNone(d2.original_file)
+        self.assertNotEqual(d2.id, d.id)
+
+    def test_change_file(self):
+        d = self.api.create_document_from_file(PDF_PATH)
+        d = self.api.change_document_file(
+            d, os.path.join(os.path.dirname(__file__), 'document2.pdf'))
+        self.assertEqual(d.title, u'document2')
+        self.assertEqual(d.original_file.name, u'document2.pdf')
+        self.assertEqual(d.object_version, 2)
+
+    def test_update_and_get(self):
+        d = self._prepared()
+        self.assertEqual(d.title, u'contract')
+        self.assertTrue(d.saved_as_draft)
+        self.assertEqual(len(d.signatories), 2)
+        self.assertEqual(d.object_version, 2)
+
+        d2 = self.api.get_document(d.id)
+        self.assertEqual(d2.title, u'contract')
+        self.assertIs(self.api.refresh_document(d2), d2)
+
+    def test_attachments(self):
+        d = self._prepared()
+        d.author_attachments.add(AA(u'terms.pdf', b'terms'))
+        d = self.api.update_document(d)
+        attachment, = d.author_attachments
+        self.assertEqual(attachment.name, u'terms.pdf')
+        self.assertEqual(attachment.get_bytes(), b'terms')
+
+    def test_signing(self):
+        d = self.api.ready(self._prepared())
+        self.assertEqual(d.status, DS.pending)
+        self.assertEqual(d.current_sign_order, 1)
+        self.assertEqual(d.signing_deadline.year, 2016)
+
+        d = self.api._sign(d, d.author)
+        self.assertEqual(d.status, DS.pending)
+        d = self.api._sign(d, d.other_signatory())
+        self.assertEqual(d.status, DS.closed)
+        self.assertIsNone(d.sealed_document)
+        d = self.api.get_document(d.id)
+        self.assertEqual(d.sealed_document.get_bytes(), self.pdf)
+
+    def test_viewers_only(self):
+        d = self.api.create_document_from_file(PDF_PATH)
+        d.author.viewer = True
+        d = self.api.ready(self.api.update_document(d))
+        self.assertEqual(d.status, DS.pending)
+        self.assertEqual(d.current_sign_order, 1)
+
+    def test_sign_order(self):
+        d = self._prepared()
+        d.signatories.add(Signatory(sign_order=2))
+        d = self.api.ready(self.api.update_document(d))
+        first_ids = [s.id for s in d.signatories if s.sign_order == 1]
+        second, = [s for s in d.signatories if s.sign_order == 2]
+        second_id = second.id
+        with self.assertRaises(requests.HTTPError):
+            self.api._sign(self.api.get_document(d.id), second)
+        for first_id in first_ids:
+            first, = [s for s in d.signatories if s.id == first_id]
+            d = self.api._sign(d, first)
+        self.assertEqual(d.current_sign_order, 2)
+        second, = [s for s in d.signatories if s.id == second_id]
+        d = self.api._sign(d, second)
+        self.assertEqual(d.status, DS.closed)
+
+    def test_invalid_transitions(self):
+        d = self.api.create_document_from_file(None)
+        for call, status in ((lambda: self.api.ready(d), 409),
+                             (lambda: self.api.get_document(u'nope'), 404)):
+            try:
+                call()
+            except requests.HTTPError as e:
+                self.assertEqual(e.response.status_code, status)
+            else:
+                self.fail(u'HTTPError not raised')
+
+    def test_delete(self):
+        d = self.api.ready(self._prepared())
+        document_id = d.id
+        self.api.trash_document(d)
+        d = self.api.get_document(document_id)
+        self.assertEqual(d.status, DS.canceled)
+        self.assertEqual(d.deletion_status, DelS.in_trash)
+        self.api.delete_document(d)
+        d = self.api.get_document(document_id)
+        self.assertEqual(d.deletion_status, DelS.deleted)
+
+    def test_list(self):
+        ids = [self._prepared().id for _ in range(5)]
+        pending = self.api.ready(self.api.get_document(ids[0]))
+        self.assertEqual([d.id for d in self.api.list_documents(page_size=2)],
+                         ids)
+        self.assertEqual([d.id for d in
+                          self.api.list_documents(statuses=[DS.pending])],
+                         [pending.id])
+
+    def test_ranges(self):
+        d = self._prepared()
+        with utils.temporary_dir() as dir_path:
+            file_path = os.path.join(dir_path, 'document.pdf')
+            d.original_file.save_as(file_path, max_workers=3)
+            with open(file_path, 'rb') as f:
+                self.assertEqual(f.read(), self.pdf)
+        url = d.original_file._url_elems()
+        response = self.api._make_request(url, method=b'GET',
+                                          headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.pdf[10:20])
+
+    def test_server(self):
+        with FakeScriveServer(self.fake) as server:
+            self.assertIs(server.fake, self.fake)
+            api = server.api()
+            d = api.create_document_from_file(PDF_PATH)
+            self.assertEqual(self.api.get_document(d.id).id, d.id)
+            self.assertEqual(d.original_file.get_bytes(), self.pdf)
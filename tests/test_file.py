@@ -89,3 +89,47 @@ class RemoteFileTest(utils.IntegrationTestCase):
         f._set_invalid()
         with self.assertRaises(InvalidScriveObject):
             f.name
+
+
+class RemoteFileChunksTest(utils.TestCase):
+
+    CONTENT = b'0123456789' * 1000
+
+    @contextlib.contextmanager
+    def _file(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on('downloadfile',
+                      lambda request: (200, {}, self.CONTENT))
+            yield server.api().get_document(u'1234').original_file
+
+    def test_iter_chunks(self):
+        with self._file() as file_:
+            chunks = list(file_.iter_chunks(3000))
+        self.assertEqual([len(chunk) for chunk in chunks],
+                         [3000, 3000, 3000, 1000])
+        self.assertEqual(b''.join(chunks), self.CONTENT)
+
+    def test_readinto(self):
+        buffer_ = bytearray(4000)
+        with self._file() as file_:
+            with contextlib.closing(file_.stream()) as s:
+                self.assertEqual(s.readinto(buffer_), 4000)
+                self.assertEqual(bytes(buffer_), self.CONTENT[:4000])
+                self.assertEqual(s.readinto(buffer_), 4000)
+                self.assertEqual(s.readinto(buffer_), 2000)
+                self.assertEqual(s.readinto(buffer_), 0)
+
+    def test_save_as_fsync(self):
+        synced = []
+        fsync = os.fsync
+        os.fsync = synced.append
+        try:
+            with self._file() as file_:
+                with utils.temporary_file_path() as file_path:
+                    file_.save_as(file_path, block_size=999, fsync=True)
+                    with open(file_path, 'rb') as f:
+                        self.assertEqual(f.read(), self.CONTENT)
+        finally:
+            os.fsync = fsync
+        self.assertEqual(len(synced), 1)
@@ -0,0 +1,86 @@
+import json
+
+import requests
+
+from scrivepy import MetricsCollector, RetryPolicy, _metrics
+from tests import utils
+
+
+class HistogramTest(utils.TestCase):
+
+    def test_observe(self):
+        h = _metrics.Histogram([1., .1])
+        for value in [.05, .1, .5, 3.]:
+            h.observe(value)
+        self.assertEqual(h.snapshot(),
+                         {u'buckets': [(.1, 2), (1., 3),
+                                       (float('inf'), 4)],
+                          u'sum': 3.65,
+                          u'count': 4})
+
+
+class MetricsCollectorTest(utils.TestCase):
+
+    def test_collect(self):
+        state = {'calls': 0}
+
+        def ready(request):
+            state['calls'] += 1
+            return 503, {}, b''
+
+        metrics = MetricsCollector()
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on('ready', ready)
+            api = server.api(retry_policy=RetryPolicy(backoff_factor=.01))
+            metrics.install(api)
+            d = api.get_document(u'1234')
+            api.get_document(u'1234')
+            with self.assertRaises(requests.HTTPError):
+                api.ready(d)
+            metrics.uninstall(api)
+            api.get_document(u'1234')
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(sorted(snapshot), [u'get', u'ready'])
+
+        get = snapshot[u'get']
+        self.assertEqual(get[u'requests'], 2)
+        self.assertEqual(get[u'errors'], 0)
+        self.assertEqual(get[u'retries'], 0)
+        self.assertEqual(get[u'bytes_received'],
+                         2 * len(json.dumps(utils.document_json())))
+        self.assertEqual(get[u'latency'][u'count'], 2)
+        self.assertEqual(get[u'ttfb'][u'count'], 2)
+        self.assertEqual(get[u'parse_time'][u'count'], 2)
+
+        ready = snapshot[u'ready']
+        self.assertEqual(ready[u'requests'], 1)
+        self.assertEqual(ready[u'errors'], 1)
+        self.assertEqual(ready[u'parse_time'][u'count'], 0)
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {})
+
+    def test_to_prometheus(self):
+        metrics = MetricsCollector(buckets=[.5])
+        with utils.StubServer() as server:
+            server.on_document('get')
+            api = server.api()
+            metrics.install(api)
+            api.get_document(u'1234')
+
+        text = metrics.to_prometheus()
+        lines = text.splitlines()
+        self.assertTrue(text.endswith(u'\n'))
+        self.assertIn(u'# TYPE scrive_requests_total counter', lines)
+        self.assertIn(u'scrive_requests_total{endpoint="get"} 1', lines)
+        self.assertIn(u'scrive_request_errors_total{endpoint="get"} 0', lines)
+        self.assertIn(u'# TYPE scrive_request_duration_seconds histogram',
+                      lines)
+        self.assertIn(u'scrive_request_duration_seconds_bucket'
+                      u'{endpoint="get",le="0.5"} 1', lines)
+        self.assertIn(u'scrive_request_duration_seconds_bucket'
+                      u'{endpoint="get",le="+Inf"} 1', lines)
+        self.assertIn(u'scrive_request_duration_seconds_count'
+                      u'{endpoint="get"} 1', lines)
@@ -0,0 +1,201 @@
+import json
+import threading
+
+from scrivepy import DocumentPoller
+from tests import utils
+
+
+# modification time of utils.document_json()
+MTIME = 1464782400.
+DAY = 24 * 3600.
+
+
+class DocumentPollerTest(utils.TestCase):
+
+    def setUp(self):
+        self.now = MTIME
+        self.documents = {}
+        self.changes = []
+        self.errors = []
+
+    def _clock(self):
+        return self.now
+
+    def _server(self):
+        server = utils.StubServer()
+
+        def get(request):
+            document_id = request.args[0]
+            if document_id not in self.documents:
+                return 404, {}, b''
+            document_json = self.documents[document_id]
+            etag = b'"%d"' % (document_json[u'objectversion'],)
+            if request.headers.get('if-none-match') == etag:
+                return 304, {'ETag': etag}, b''
+            return 200, {'ETag': etag}, json.dumps(document_json)
+        server.on('get', get)
+        return server
+
+    def _document(self, document_id, **kwargs):
+        kwargs.setdefault(u'status', u'Pending')
+        kwargs.setdefault(u'objectversion', 1)
+        self.documents[document_id] = utils.document_json(id=document_id,
+                                                          **kwargs)
+
+    def _change(self, document_id, **kwargs):
+        document_json = self.documents[document_id]
+        document_json.update(kwargs)
+        document_json[u'objectversion'] += 1
+
+    def _poller(self, api, **kwargs):
+        return DocumentPoller(
+            api, self.changes.append,
+            error_handler=lambda *args: self.errors.append(args),
+            clock=self._clock, **kwargs)
+
+    def test_idle_intervals(self):
+        with self._server() as server:
+            api = server.api()
+            self._document(u'1')
+            poller = self._poller(api)
+
+            # modified just now
+            poller.add(api.get_document(u'1'))
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 30)
+
+            self.now = MTIME + 1000
+            poller.add(api.get_document(u'1'))
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 100)
+
+            # idle for days
+            self.now = MTIME + 10 * DAY
+            poller.add(api.get_document(u'1'))
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 6 * 3600)
+            self.assertEqual(poller.next_poll_time(), self.now + 6 * 3600)
+
+    def test_upcoming_events(self):
+        self.now = MTIME + 10 * DAY
+        with self._server() as server:
+            api = server.api()
+            self._document(u'1', autoremindtime=u'2016-06-11T12:01:40Z')
+            self._document(u'2', timeouttime=u'2016-06-11T11:58:20Z')
+            poller = self._poller(api)
+            poller.add(api.get_document(u'1'))
+            poller.add(api.get_document(u'2'))
+            # right after the reminder
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 130)
+            # deadline passed 100 seconds ago, counts as activity
+            self.assertEqual(poller.next_poll_time(u'2'), self.now + 30)
+
+    def test_changes(self):
+        with self._server() as server:
+            api = server.api()
+            self._document(u'1')
+            self._document(u'2')
+            poller = self._poller(api)
+            poller.add(api.get_document(u'1'))
+            self.now += 10
+            poller.add(api.get_document(u'2'))
+
+            self.now += 25
+            self._change(u'1', title=u'new title')
+            self._change(u'2', title=u'new title')
+            self.assertEqual(poller.poll(), 1)
+            change, = self.changes
+            self.assertEqual(change.document_id, u'1')
+            self.assertEqual(change.document.title, u'new title')
+            self.assertEqual(change.previous.title, u'document')
+            self.assertFalse(change.status_changed)
+            self.assertFalse(change.finished)
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 30)
+
+            self.now += 30
+            self._change(u'1', status=u'Closed')
+            self.assertEqual(poller.poll(), 2)
+            self.assertEqual(len(self.changes), 3)
+            closing = [c for c in self.changes[1:] if c.document_id == u'1']
+            self.assertTrue(closing[0].status_changed)
+            self.assertTrue(closing[0].finished)
+            self.assertNotIn(u'1', poller)
+            self.assertIn(u'2', poller)
+
+    def test_unchanged(self):
+        with self._server() as server:
+            api = server.api()
+            self._document(u'1')
+            poller = self._poller(api)
+            poller.add(api.get_document(u'1'))
+            self.assertEqual(poller.poll(), 0)
+
+            self.now += 100
+            self.assertEqual(poller.poll(), 1)
+            self.assertEqual(self.changes, [])
+            self.assertEqual(server.requests[-1].headers['if-none-match'],
+                             b'"1"')
+            # idle for 100 seconds
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 30)
+
+    def test_errors(self):
+        with self._server() as server:
+            api = server.api()
+            self._document(u'1')
+            poller = self._poller(api)
+            poller.add(api.get_document(u'1'))
+            del self.documents[u'1']
+
+            self.now += 30
+            poller.poll()
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 30)
+            self.now += 30
+            poller.poll()
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 60)
+            self.assertEqual([document_id for document_id, _ in self.errors],
+                             [u'1', u'1'])
+
+            self._document(u'1')
+            self.now += 60
+            poller.poll()
+            self.assertEqual(poller.next_poll_time(u'1'), self.now + 30)
+
+    def test_remove(self):
+        with self._server() as server:
+            api = server.api()
+            self._document(u'1')
+            poller = self._poller(api)
+            poller.add(api.get_document(u'1'))
+            poller.remove(u'1')
+            self.assertEqual(len(poller), 0)
+            self.assertIsNone(poller.next_poll_time())
+            self.now += 30
+            self.assertEqual(poller.poll(), 0)
+
+    def test_background_thread(self):
+        changed = threading.Event()
+        with self._server() as server:
+            api = server.api()
+            self._document(u'1')
+            poller = DocumentPoller(api, lambda change: changed.set(),
+                                    min_interval=.05, max_interval=.1,
+                                    polls_per_second=100)
+            with poller:
+                poller.start()
+                poller.add(api.get_document(u'1'))
+                self._change(u'1', title=u'new title')
+                self.assertTrue(changed.wait(5))
+
+    def test_worker_pool(self):
+        with self._server() as server:
+            api = server.api()
+            self._document(u'1')
+            self._document(u'2')
+            with self._poller(api, max_workers=2) as poller:
+                poller.add(api.get_document(u'1'))
+                poller.add(api.get_document(u'2'))
+                self.now += 30
+                self.assertEqual(poller.poll(), 2)
+                workers = poller._workers
+                self.now += 30
+                self.assertEqual(poller.poll(), 2)
+                # kept between polls
+                self.assertIs(poller._workers, workers)
+            self.assertIsNone(poller._workers)
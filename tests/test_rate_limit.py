@@ -0,0 +1,64 @@
+import threading
+import time
+
+from scrivepy import RateLimiter, _rate_limit
+from tests import utils
+
+
+class RateLimiterTest(utils.TestCase):
+
+    def test_requests_per_second(self):
+        limiter = RateLimiter(requests_per_second=20, burst=1)
+        start = time.time()
+        for i in range(6):
+            with limiter:
+                pass
+        # first request uses the initial token, the rest wait 1/20s each
+        self.assertTrue(time.time() - start >= .24)
+
+    def test_burst(self):
+        limiter = RateLimiter(requests_per_second=1, burst=5)
+        start = time.time()
+        for i in range(5):
+            with limiter:
+                pass
+        self.assertTrue(time.time() - start < .1)
+
+    def test_max_in_flight(self):
+        limiter = RateLimiter(max_in_flight=2)
+        lock = threading.Lock()
+        state = {'in_flight': 0, 'max_in_flight': 0}
+
+        def work():
+            with limiter:
+                with lock:
+                    state['in_flight'] += 1
+                    state['max_in_flight'] = max(state['max_in_flight'],
+                                                 state['in_flight'])
+                time.sleep(.02)
+                with lock:
+                    state['in_flight'] -= 1
+
+        threads = [threading.Thread(target=work) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(state['max_in_flight'], 2)
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError,
+                               u'requests_per_second must be positive'):
+            RateLimiter(requests_per_second=0)
+        with self.assertRaises(ValueError,
+                               u'max_in_flight must be at least 1'):
+            RateLimiter(max_in_flight=0)
+
+    def test_shared_rate_limiter(self):
+        limiter = _rate_limit.shared_rate_limiter(('test', 1), 10)
+        self.assertIs(limiter,
+                      _rate_limit.shared_rate_limiter(('test', 1), 10))
+        self.assertIsNot(limiter,
+                         _rate_limit.shared_rate_limiter(('test', 2), 10))
+        with self.assertRaises(ValueError):
+            _rate_limit.shared_rate_limiter(('test', 1), 10, max_in_flight=2)
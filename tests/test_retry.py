@@ -0,0 +1,116 @@
+import socket
+import time
+
+import requests
+from requests.packages.urllib3 import exceptions as urllib3_exceptions
+
+from scrivepy import RetryPolicy, _retry
+from tests import utils
+
+
+def connect_error():
+    reason = urllib3_exceptions.NewConnectionError(None, u'refused')
+    return requests.exceptions.ConnectionError(
+        urllib3_exceptions.MaxRetryError(None, u'/', reason))
+
+
+def read_error():
+    return requests.exceptions.ConnectionError(
+        socket.error(u'connection reset'))
+
+
+def response(status, headers=None):
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers or {})
+    return result
+
+
+class RetryPolicyTest(utils.TestCase):
+
+    def test_is_connect_error(self):
+        self.assertTrue(_retry.is_connect_error(connect_error()))
+        self.assertTrue(_retry.is_connect_error(
+            requests.exceptions.ConnectTimeout()))
+        self.assertFalse(_retry.is_connect_error(read_error()))
+        self.assertFalse(_retry.is_connect_error(
+            requests.exceptions.ReadTimeout()))
+
+    def test_idempotent(self):
+        policy = RetryPolicy()
+        now = time.time()
+        for exc in [connect_error(), read_error(),
+                    requests.exceptions.ReadTimeout()]:
+            self.assertIsNotNone(
+                policy.retry_delay(0, now, True, exception=exc))
+        self.assertIsNotNone(
+            policy.retry_delay(0, now, True, response=response(503)))
+        self.assertIsNone(
+            policy.retry_delay(0, now, True, response=response(404)))
+        self.assertIsNone(
+            policy.retry_delay(0, now, True, response=response(200)))
+
+    def test_non_idempotent(self):
+        policy = RetryPolicy()
+        now = time.time()
+        self.assertIsNotNone(
+            policy.retry_delay(0, now, False, exception=connect_error()))
+        self.assertIsNone(
+            policy.retry_delay(0, now, False, exception=read_error()))
+        self.assertIsNone(
+            policy.retry_delay(0, now, False,
+                               exception=requests.exceptions.ReadTimeout()))
+        self.assertIsNone(
+            policy.retry_delay(0, now, False, response=response(503)))
+
+    def test_max_retries(self):
+        policy = RetryPolicy(max_retries=2)
+        now = time.time()
+        self.assertIsNotNone(
+            policy.retry_delay(1, now, True, exception=read_error()))
+        self.assertIsNone(
+            policy.retry_delay(2, now, True, exception=read_error()))
+
+        with self.assertRaises(ValueError,
+                               u'max_retries must be non-negative'):
+            RetryPolicy(max_retries=-1)
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=1., max_backoff=5.)
+        for i in range(100):
+            self.assertTrue(0. <= policy.backoff(0) <= 1.)
+            self.assertTrue(0. <= policy.backoff(2) <= 4.)
+            self.assertTrue(0. <= policy.backoff(10) <= 5.)
+
+    def test_retry_after(self):
+        policy = RetryPolicy(backoff_factor=.01)
+        delay = policy.retry_delay(0, time.time(), True,
+                                   response=response(429,
+                                                     {'Retry-After': '3'}))
+        self.assertEqual(delay, 3.)
+
+        # not longer than max_backoff
+        policy = RetryPolicy(backoff_factor=.01, max_backoff=2.)
+        delay = policy.retry_delay(0, time.time(), True,
+                                   response=response(429,
+                                                     {'Retry-After': '3600'}))
+        self.assertEqual(delay, 2.)
+
+    def test_request_timeout(self):
+        now = time.time()
+        self.assertIsNone(RetryPolicy().request_timeout(now))
+        self.assertEqual(RetryPolicy(timeout=5.).request_timeout(now), 5.)
+        self.assertTrue(
+            9. < RetryPolicy(deadline=10.).request_timeout(now) <= 10.)
+        self.assertEqual(
+            RetryPolicy(deadline=10., timeout=5.).request_timeout(now), 5.)
+        self.assertTrue(
+            0 < RetryPolicy(deadline=10.).request_timeout(now - 11) < .01)
+
+    def test_deadline(self):
+        policy = RetryPolicy(backoff_factor=.01, deadline=10.)
+        self.assertIsNotNone(
+            policy.retry_delay(0, time.time(), True, exception=read_error()))
+        self.assertIsNone(
+            policy.retry_delay(0, time.time() - 11, True,
+                               exception=read_error()))
@@ -1,16 +1,34 @@
+import json
+import os
+import threading
 import time
+import zlib
 from datetime import datetime
 
+import requests
 from dateutil import tz
 
 from scrivepy import (
+    AttachmentRegistry,
     AuthenticationMethod as AM,
     AuthorAttachment as AA,
+    FileAuthorAttachment as FAA,
     InvitationDeliveryMethod as IDM,
     DocumentStatus as DS,
     DeletionStatus as DelS,
-    Language as Lang
+    Language as Lang,
+    MmapAuthorAttachment as MAA,
+    Error,
+    InvalidResponse,
+    RateLimiter,
+    RetryPolicy,
+    Scrive,
+    DocumentCache,
+    DiskDocumentCache,
+    InvalidScriveObject,
+    ReadOnlyScriveObject
 )
+from scrivepy import _attachment_registry
 from tests import utils
 
 
@@ -418,3 +436,1059 @@ class ScriveTest(utils.IntegrationTestCase):
                 self.assertPDFsEqual(contents, f.get_bytes())
                 if f.name == u'document1.pdf':
                     self.assertEqual(f.id, id1)
+
+
+class ScriveConnectionPoolTest(utils.TestCase):
+
+    def test_connections_are_reused(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            with server.api() as api:
+                api.get_document(u'1234')
+                api.get_document(u'1234')
+            self.assertEqual(len(server.requests), 2)
+            self.assertEqual(server.connections, 1)
+
+    def test_keep_alive_disabled(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            with server.api(keep_alive=False) as api:
+                api.get_document(u'1234')
+                api.get_document(u'1234')
+            self.assertEqual(server.connections, 2)
+
+    def test_download_reuses_connection(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on('downloadfile', lambda request: (200, {}, b'pdf'))
+            with server.api() as api:
+                d = api.get_document(u'1234')
+                self.assertEqual(d.original_file.get_bytes(), b'pdf')
+                api.get_document(u'1234')
+            self.assertEqual(server.requests[1].args,
+                             [u'1234', u'5678', u'document.pdf'])
+            self.assertEqual(server.connections, 1)
+
+    def test_close(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            api = server.api()
+            with api:
+                api.get_document(u'1234')
+            with self.assertRaises(Error, u'Scrive client is closed'):
+                api.get_document(u'1234')
+
+
+class ScriveGetDocumentsTest(utils.TestCase):
+
+    def _get(self, request):
+        doc_id = request.args[0]
+        if doc_id == u'missing':
+            return 404, {}, b'not found'
+        if doc_id == u'broken':
+            return 200, {}, b'{}'
+        # make later documents arrive first
+        time.sleep(.3 / int(doc_id))
+        return 200, {}, json.dumps(utils.document_json(id=doc_id))
+
+    def test_ordered(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get)
+            with server.api() as api:
+                ids = [u'1', u'missing', u'2', u'broken', u'3']
+                results = list(api.get_documents(ids, max_workers=5))
+
+        self.assertEqual([r[0] for r in results], ids)
+        for doc_id, doc, err in results:
+            if doc_id in (u'missing', u'broken'):
+                self.assertIsNone(doc)
+            else:
+                self.assertEqual(doc.id, doc_id)
+                self.assertIsNone(err)
+        self.assertIsInstance(results[1][2], requests.HTTPError)
+        self.assertIsInstance(results[3][2], InvalidResponse)
+
+    def test_unordered(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get)
+            with server.api() as api:
+                results = list(api.get_documents([u'1', u'2', u'3'],
+                                                 max_workers=3,
+                                                 ordered=False))
+
+        self.assertEqual([doc.id for _, doc, _ in results],
+                         [u'3', u'2', u'1'])
+
+    def test_bounded_workers(self):
+        lock = threading.Lock()
+        state = {'in_flight': 0, 'max_in_flight': 0}
+
+        def get(request):
+            with lock:
+                state['in_flight'] += 1
+                state['max_in_flight'] = max(state['max_in_flight'],
+                                             state['in_flight'])
+            time.sleep(.05)
+            with lock:
+                state['in_flight'] -= 1
+            return 200, {}, json.dumps(utils.document_json())
+
+        with utils.StubServer() as server:
+            server.on('get', get)
+            with server.api() as api:
+                # distinct ids, identical ones would be coalesced
+                ids = [unicode(i) for i in range(12)]
+                results = list(api.get_documents(ids, max_workers=3))
+
+        self.assertEqual(len(results), 12)
+        self.assertEqual(state['max_in_flight'], 3)
+
+
+class ScriveListDocumentsTest(utils.TestCase):
+
+    def _list(self, total):
+        def handler(request):
+            offset = int(request.query['offset'])
+            count = min(int(request.query['max']), total - offset)
+            docs = [utils.document_json(id=unicode(offset + i + 1))
+                    for i in range(count)]
+            return 200, {}, json.dumps({u'total_matching': total,
+                                        u'documents': docs})
+        return handler
+
+    def test_pages(self):
+        with utils.StubServer() as server:
+            server.on('list', self._list(7))
+            with server.api() as api:
+                docs = list(api.list_documents(page_size=3))
+            self.assertEqual([doc.id for doc in docs],
+                             [unicode(i) for i in range(1, 8)])
+            self.assertEqual([request.query['offset']
+                              for request in server.requests],
+                             ['0', '3', '6'])
+            self.assertEqual(json.loads(server.requests[0].query['filter']),
+                             [])
+
+    def test_filters(self):
+        with utils.StubServer() as server:
+            server.on('list', self._list(0))
+            with server.api() as api:
+                docs = list(api.list_documents(
+                    statuses=[DS.pending, u'Closed'], tags={u'key': u'val'},
+                    modified_after=datetime(2016, 6, 1, 12),
+                    modified_before=datetime(2016, 7, 1)))
+            self.assertEqual(docs, [])
+            filters = json.loads(server.requests[0].query['filter'])
+
+        self.assertEqual(filters, [
+            {u'filter_by': u'status', u'statuses': [u'Pending', u'Closed']},
+            {u'filter_by': u'tags',
+             u'value': [{u'name': u'key', u'value': u'val'}]},
+            {u'filter_by': u'mtime', u'start_time': u'2016-06-01T12:00:00',
+             u'end_time': u'2016-07-01T00:00:00'}])
+
+    def test_prefetch(self):
+        second_page = threading.Event()
+        list_page = self._list(4)
+
+        def handler(request):
+            if request.query['offset'] == '2':
+                second_page.set()
+            return list_page(request)
+
+        with utils.StubServer() as server:
+            server.on('list', handler)
+            with server.api() as api:
+                docs = api.list_documents(page_size=2)
+                self.assertEqual(next(docs).id, u'1')
+                # requested before the first page is consumed
+                self.assertTrue(second_page.wait(5))
+                docs.close()
+            self.assertEqual(len(server.requests), 2)
+
+
+class ScriveSendDocumentTest(utils.TestCase):
+
+    def setUp(self):
+        self.test_doc_path = os.path.join(os.path.dirname(__file__),
+                                          'document.pdf')
+
+    def _server(self):
+        return utils.document_server(attachments=[utils.attachment_json()])
+
+    def test_unchanged(self):
+        timings = {}
+        with self._server() as server:
+            api = server.api()
+            doc = api.send_document(template_id=u'42',
+                                    prepare=lambda doc: None,
+                                    timings=timings)
+            self.assertEqual(server.endpoints,
+                             ['createfromtemplate', 'ready'])
+        self.assertIs(doc.status, DS.pending)
+        self.assertEqual(sorted(timings), ['create', 'ready'])
+
+    def test_update(self):
+        timings = {}
+        created = []
+
+        def prepare(doc):
+            created.append(doc)
+            doc.title = u'new title'
+
+        with self._server() as server:
+            api = server.api()
+            doc = api.send_document(self.test_doc_path, prepare=prepare,
+                                    timings=timings)
+            self.assertEqual(server.endpoints,
+                             ['createfromfile', 'update', 'ready'])
+            self.assertIn(b'new+title', server.requests[1].body)
+        self.assertIs(doc.status, DS.pending)
+        self.assertEqual(sorted(timings), ['create', 'ready', 'update'])
+        with self.assertRaises(InvalidScriveObject, None):
+            created[0].title
+
+    def test_attachments(self):
+        def prepare(doc):
+            doc.author_attachments.add(AA(u'a.pdf', b'content'))
+
+        with self._server() as server:
+            api = server.api()
+            api.send_document(self.test_doc_path, prepare=prepare)
+            self.assertEqual(server.endpoints,
+                             ['createfromfile', 'setattachments', 'ready'])
+
+    def test_file_or_template(self):
+        api = Scrive(b'client', b'secret', b'token', b'secret')
+        for kwargs in ({}, {'file_path': self.test_doc_path,
+                            'template_id': u'42'}):
+            with self.assertRaises(ValueError):
+                api.send_document(**kwargs)
+
+    def test_failed_prepare_deletes_draft(self):
+        def prepare(doc):
+            raise KeyError(u'boom')
+
+        with self._server() as server:
+            server.on('delete', lambda request: (200, {}, b''))
+            server.on('reallydelete', lambda request: (200, {}, b''))
+            api = server.api()
+            with self.assertRaises(KeyError):
+                api.send_document(self.test_doc_path, prepare=prepare)
+            self.assertEqual(server.endpoints,
+                             ['createfromfile', 'delete', 'reallydelete'])
+
+    def test_failed_cleanup_keeps_error(self):
+        def prepare(doc):
+            doc.title = u'new title'
+
+        with self._server() as server:
+            server.on('update', lambda request: (500, {}, b''))
+            api = server.api()
+            with self.assertRaises(requests.HTTPError,
+                                   u'500 .*/update/1234$', regex=True):
+                api.send_document(self.test_doc_path, prepare=prepare)
+            self.assertEqual(server.endpoints,
+                             ['createfromfile', 'update', 'delete'])
+
+
+class ScriveUploadTest(utils.TestCase):
+
+    def _upload(self, file_path, **kwargs):
+        with utils.StubServer() as server:
+            server.on_document('createfromfile')
+            server.api().create_document_from_file(file_path, **kwargs)
+        request, = server.requests
+        return request
+
+    def test_file_path(self):
+        calls = []
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(b'x' * 200000)
+            request = self._upload(
+                file_path, progress=lambda *args: calls.append(args))
+
+        self.assertTrue(request.headers['content-type'].startswith(
+            'multipart/form-data; boundary='))
+        self.assertEqual(int(request.headers['content-length']),
+                         len(request.body))
+        self.assertIn(b'\r\n\r\n' + b'x' * 200000 + b'\r\n', request.body)
+        self.assertIn(b'filename="%s"' % (os.path.basename(file_path),),
+                      request.body)
+        self.assertEqual(calls[-1][:2], (len(request.body),
+                                         len(request.body)))
+
+    def test_iterable(self):
+        request = self._upload(iter([b'a' * 100000, b'b' * 100000]),
+                               file_name=u'scan.pdf')
+        self.assertEqual(request.headers['transfer-encoding'], 'chunked')
+        self.assertIn(b'filename="scan.pdf"', request.body)
+        self.assertIn(b'a' * 100000 + b'b' * 100000, request.body)
+
+    def test_file_obj(self):
+        with open(os.path.join(os.path.dirname(__file__),
+                               'document.pdf'), 'rb') as f:
+            request = self._upload(f)
+            self.assertFalse(f.closed)
+            f.seek(0)
+            self.assertIn(f.read(), request.body)
+        self.assertIn(b'filename="document.pdf"', request.body)
+
+
+class ScriveRateLimitTest(utils.TestCase):
+
+    def test_shared_between_clients(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            api1 = server.api(requests_per_second=20, max_in_flight=4)
+            api2 = server.api(requests_per_second=20, max_in_flight=4)
+            self.assertIs(api1.rate_limiter, api2.rate_limiter)
+            self.assertIsNone(server.api().rate_limiter)
+
+            start = time.time()
+            for i in range(25):
+                api1.get_document(u'1234')
+                api2.get_document(u'1234')
+            # 20 requests of burst, then 30 more at 20 per second
+            self.assertTrue(time.time() - start >= 1.4)
+
+    def test_conflicting_shared_settings(self):
+        with utils.StubServer() as server:
+            server.api(requests_per_second=20, max_in_flight=4)
+            with self.assertRaises(ValueError):
+                server.api(requests_per_second=20)
+
+    def test_explicit_limiter(self):
+        limiter = RateLimiter(max_in_flight=1)
+        with utils.StubServer() as server:
+            server.on_document('get')
+            api = server.api(rate_limiter=limiter)
+            self.assertIs(api.rate_limiter, limiter)
+            api.get_document(u'1234')
+
+    def test_streamed_download_holds_slot(self):
+        limiter = RateLimiter(max_in_flight=1)
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on('downloadfile', lambda request: (200, {}, b'pdf'))
+            api = server.api(rate_limiter=limiter)
+            file_ = api.get_document(u'1234').original_file
+            stream = file_.stream()
+            self.assertEqual(stream.read(1), b'p')
+            self.assertEqual(limiter._in_flight, 1)
+            stream.close()
+            self.assertEqual(limiter._in_flight, 0)
+
+            server.on('downloadfile', lambda request: (404, {}, b'gone'))
+            with self.assertRaises(requests.HTTPError):
+                file_.get_bytes()
+            self.assertEqual(limiter._in_flight, 0)
+
+
+class ScriveRetryTest(utils.TestCase):
+
+    def _flaky(self, failures, status=503):
+        state = {'calls': 0}
+
+        def handler(request):
+            state['calls'] += 1
+            if state['calls'] <= failures:
+                return status, {}, b''
+            return 200, {}, json.dumps(utils.document_json())
+        return handler
+
+    def test_safe_requests_are_retried(self):
+        with utils.StubServer() as server:
+            server.on('get', self._flaky(2))
+            api = server.api(retry_policy=RetryPolicy(backoff_factor=.01))
+            d = api.get_document(u'1234')
+            self.assertEqual(d.id, u'1234')
+            self.assertEqual(len(server.requests), 3)
+
+    def test_retries_are_limited(self):
+        with utils.StubServer() as server:
+            server.on('get', self._flaky(5))
+            api = server.api(retry_policy=RetryPolicy(max_retries=2,
+                                                      backoff_factor=.01))
+            with self.assertRaises(requests.HTTPError):
+                api.get_document(u'1234')
+            self.assertEqual(len(server.requests), 3)
+
+    def test_unsafe_requests_are_not_retried(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on('ready', self._flaky(1))
+            api = server.api(retry_policy=RetryPolicy(backoff_factor=.01))
+            d = api.get_document(u'1234')
+            with self.assertRaises(requests.HTTPError):
+                api.ready(d)
+            self.assertEqual(len(server.requests), 2)
+
+    def test_connection_failures_are_retried(self):
+        with utils.StubServer() as server:
+            hostname = server.api_hostname
+        policy = RetryPolicy(max_retries=2, backoff_factor=.01)
+        api = Scrive(b'1', b'2', b'3', b'4', api_hostname=hostname,
+                     https=False, retry_policy=policy)
+        attempts = []
+        send = api._send
+
+        def counting_send(*args, **kwargs):
+            attempts.append(args)
+            return send(*args, **kwargs)
+
+        api._send = counting_send
+        with utils.temporary_file_path() as file_path:
+            with self.assertRaises(requests.ConnectionError):
+                api.create_document_from_file(file_path)
+        self.assertEqual(len(attempts), 3)
+
+    def test_stalled_server_times_out(self):
+        def stalled(request):
+            time.sleep(1)
+            return 200, {}, json.dumps(utils.document_json())
+
+        with utils.StubServer() as server:
+            server.on('get', stalled)
+            api = server.api(retry_policy=RetryPolicy(backoff_factor=.01,
+                                                      deadline=.3))
+            start = time.time()
+            with self.assertRaises(requests.Timeout):
+                api.get_document(u'1234')
+            self.assertTrue(time.time() - start < .8)
+
+    def test_uploads_are_rewound(self):
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(b'%PDF')
+            with utils.StubServer() as server:
+                server.on('createfromfile', self._flaky(0))
+                api = server.api(
+                    retry_policy=RetryPolicy(backoff_factor=.01))
+                send = api._send
+                failures = [requests.exceptions.ConnectTimeout()]
+
+                def failing_send(*args, **kwargs):
+                    response = send(*args, **kwargs)
+                    if failures:
+                        raise failures.pop()
+                    return response
+
+                api._send = failing_send
+                api.create_document_from_file(file_path)
+            self.assertEqual(len(server.requests), 2)
+            for request in server.requests:
+                self.assertIn(b'%PDF', request.body)
+
+
+class ScriveHooksTest(utils.TestCase):
+
+    def _recording_api(self, server, **kwargs):
+        events = []
+        hooks = dict((event, [lambda info, event=event:
+                              events.append((event, info))])
+                     for event in [u'before_request', u'after_response',
+                                   u'on_retry', u'on_error'])
+        return server.api(hooks=hooks, **kwargs), events
+
+    def test_after_response(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            api, events = self._recording_api(server)
+            api.get_document(u'1234')
+            api.get_document(u'1234')
+
+        self.assertEqual([event for event, _ in events],
+                         [u'before_request', u'after_response'] * 2)
+        info = events[1][1]
+        self.assertEqual(info.endpoint, u'get')
+        self.assertEqual(info.document_id, u'1234')
+        self.assertEqual(info.method, b'GET')
+        self.assertEqual(info.status_code, 200)
+        self.assertEqual(info.attempt, 0)
+        self.assertEqual(info.bytes_sent, 0)
+        self.assertEqual(info.bytes_received,
+                         len(json.dumps(utils.document_json())))
+        self.assertTrue(info.connect_time > 0)
+        self.assertTrue(0 < info.ttfb <= info.total_time)
+        self.assertTrue(0 < info.parse_time <= info.total_time)
+        self.assertIsNone(info.exception)
+
+        # second request reused the connection
+        self.assertEqual(events[3][1].connect_time, 0)
+
+    def test_on_error_and_retry(self):
+        with utils.StubServer() as server:
+            server.on('get', lambda request: (503, {}, b''))
+            api, events = self._recording_api(
+                server, retry_policy=RetryPolicy(max_retries=1,
+                                                 backoff_factor=.01))
+            with self.assertRaises(requests.HTTPError):
+                api.get_document(u'1234')
+
+        self.assertEqual([event for event, _ in events],
+                         [u'before_request', u'on_retry', u'on_error'])
+        info = events[2][1]
+        self.assertEqual(info.attempt, 1)
+        self.assertEqual(info.status_code, 503)
+        self.assertIsInstance(info.exception, requests.HTTPError)
+
+    def test_parse_errors(self):
+        with utils.StubServer() as server:
+            server.on('get', lambda request: (200, {}, b'{}'))
+            api, events = self._recording_api(server)
+            with self.assertRaises(InvalidResponse):
+                api.get_document(u'1234')
+        self.assertIsInstance(events[-1][1].exception, InvalidResponse)
+
+    def test_register_hook(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            api = server.api()
+            infos = []
+            api.register_hook(u'after_response', infos.append)
+            api.get_document(u'1234')
+            self.assertTrue(api.deregister_hook(u'after_response',
+                                                infos.append))
+            self.assertFalse(api.deregister_hook(u'after_response',
+                                                 infos.append))
+            api.get_document(u'1234')
+            self.assertEqual(len(infos), 1)
+
+            with self.assertRaises(ValueError, u'Unknown hook event: foo'):
+                api.register_hook(u'foo', infos.append)
+
+
+class ScriveCompressionTest(utils.TestCase):
+
+    def test_compressed_responses(self):
+        body = json.dumps(utils.document_json(title=u'x' * 10000))
+        compressed = zlib.compress(body)
+
+        def get(request):
+            self.assertIn(u'gzip', request.headers['accept-encoding'])
+            return 200, {'Content-Encoding': 'deflate'}, compressed
+
+        infos = []
+        with utils.StubServer() as server:
+            server.on('get', get)
+            api = server.api(hooks={u'after_response': [infos.append]})
+            d = api.get_document(u'1234')
+
+        self.assertEqual(d.title, u'x' * 10000)
+        self.assertEqual(infos[0].bytes_received, len(compressed))
+        self.assertEqual(infos[0].bytes_received_uncompressed, len(body))
+
+    def test_non_ascii_response(self):
+        body = json.dumps(utils.document_json(title=u'\u017c\xf3\u0142w'),
+                          ensure_ascii=False).encode('utf-8')
+        with utils.StubServer() as server:
+            server.on('get', lambda request: (200, {}, body))
+            d = server.api().get_document(u'1234')
+        self.assertEqual(d.title, u'\u017c\xf3\u0142w')
+
+    def test_compressed_update(self):
+        infos = []
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on_document('setattachments')
+            server.on_document('update')
+            api = server.api(request_compression_threshold=100,
+                             hooks={u'after_response': [infos.append]})
+            d = api.get_document(u'1234')
+            d.title = u'y' * 1000
+            api.update_document(d)
+
+        request = server.requests[-1]
+        self.assertEqual(request.endpoint, u'update')
+        self.assertEqual(request.headers['content-encoding'], 'gzip')
+        body = zlib.decompress(request.body, 16 + zlib.MAX_WBITS)
+        self.assertIn(b'y' * 1000, body)
+        self.assertEqual(infos[-1].bytes_sent, len(request.body))
+        self.assertEqual(infos[-1].bytes_sent_uncompressed, len(body))
+
+    def test_uncompressed_update_by_default(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on_document('setattachments')
+            server.on_document('update')
+            api = server.api()
+            d = api.get_document(u'1234')
+            d.title = u'y' * 1000
+            api.update_document(d)
+        self.assertEqual(server.requests[-1].endpoint, u'update')
+        self.assertNotIn('content-encoding', server.requests[-1].headers)
+
+
+class ScriveUpdateAttachmentsTest(utils.TestCase):
+
+    def _server(self):
+        return utils.document_server(attachments=[utils.attachment_json()])
+
+    def test_unchanged(self):
+        with self._server() as server:
+            api = server.api()
+            d = api.get_document(u'1234')
+            d.title = u'new title'
+            api.update_document(d)
+            self.assertEqual(server.endpoints, ['get', 'update'])
+
+    def test_untouched_document(self):
+        with self._server() as server:
+            api = server.api()
+            d = api.get_document(u'1234')
+            self.assertIs(api.update_document(d), d)
+            self.assertEqual(server.endpoints, ['get'])
+
+    def test_added(self):
+        with self._server() as server:
+            api = server.api()
+            d = api.get_document(u'1234')
+            d.author_attachments.add(AA(u'b.pdf', b'content'))
+            api.update_document(d)
+            self.assertEqual(server.endpoints,
+                             ['get', 'setattachments', 'update'])
+            self.assertIn(b'content', server.requests[1].body)
+
+    def test_file_backed(self):
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(b'file content')
+            with self._server() as server:
+                api = server.api()
+                d = api.get_document(u'1234')
+                d.author_attachments.add(FAA(file_path, name=u'b.pdf'))
+                api.update_document(d)
+                request = server.requests[1]
+                self.assertIn(b'file content', request.body)
+                # streamed with a known length, not read in one piece
+                self.assertTrue(request.headers['content-type'].startswith(
+                    b'multipart/form-data; boundary='))
+                self.assertEqual(int(request.headers['content-length']),
+                                 len(request.body))
+
+    def test_mmap_backed(self):
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(b'x' * 200000)
+            with self._server() as server:
+                api = server.api(attachment_registry=AttachmentRegistry())
+                d = api.get_document(u'1234')
+                d.author_attachments.add(MAA(file_path, name=u'b.pdf'))
+                api.update_document(d)
+                request = server.requests[1]
+                self.assertIn(b'x' * 200000, request.body)
+                self.assertEqual(int(request.headers['content-length']),
+                                 len(request.body))
+
+    def test_removed(self):
+        with self._server() as server:
+            api = server.api()
+            d = api.get_document(u'1234')
+            d.author_attachments.clear()
+            api.update_document(d)
+            self.assertEqual(server.endpoints,
+                             ['get', 'setattachments', 'update'])
+
+    def test_modified(self):
+        with self._server() as server:
+            api = server.api()
+            d = api.get_document(u'1234')
+            attachment, = d.author_attachments
+            attachment.mandatory = True
+            api.update_document(d)
+            self.assertEqual(server.endpoints,
+                             ['get', 'setattachments', 'update'])
+
+
+class ScriveAttachmentRegistryTest(utils.TestCase):
+
+    def _server(self, reject_references=False):
+        attachments = [utils.attachment_json(id=u'77', name=u'terms.pdf')]
+        body = json.dumps(utils.document_json(authorattachments=attachments))
+
+        def set_attachments(request):
+            if reject_references and b'content' not in request.body:
+                return 400, {}, b'no such file'
+            return 200, {}, body
+        return utils.document_server(set_attachments=set_attachments)
+
+    def _update(self, api, attachment):
+        d = api.get_document(u'1234')
+        d.author_attachments.add(attachment)
+        api.update_document(d)
+
+    def test_reused(self):
+        registry = AttachmentRegistry()
+        with self._server() as server:
+            api = server.api(attachment_registry=registry)
+            self.assertIs(api.attachment_registry, registry)
+            self._update(api, AA(u'terms.pdf', b'content'))
+            self.assertIn(b'content', server.requests[1].body)
+            self.assertEqual(len(registry), 1)
+
+            self._update(api, AA(u'terms.pdf', b'content'))
+            body = server.requests[4].body
+            self.assertNotIn(b'content', body)
+            self.assertIn(b'77', body)
+
+            self._update(api, AA(u'terms.pdf', b'other content'))
+            self.assertIn(b'other content', server.requests[7].body)
+
+    def test_without_registry(self):
+        with self._server() as server:
+            api = server.api()
+            self._update(api, AA(u'terms.pdf', b'content'))
+            self._update(api, AA(u'terms.pdf', b'content'))
+            self.assertIn(b'content', server.requests[4].body)
+
+    def test_file_backed(self):
+        registry = AttachmentRegistry()
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(b'content')
+            with self._server() as server:
+                api = server.api(attachment_registry=registry)
+                self._update(api, FAA(file_path, name=u'terms.pdf'))
+                self.assertIn(b'content', server.requests[1].body)
+
+                self._update(api, FAA(file_path, name=u'terms.pdf'))
+                self.assertNotIn(b'content', server.requests[4].body)
+
+                # in-memory attachment with the same content
+                self._update(api, AA(u'terms.pdf', b'content'))
+                self.assertNotIn(b'content', server.requests[7].body)
+
+                with open(file_path, 'wb') as f:
+                    f.write(b'changed content')
+                self._update(api, FAA(file_path, name=u'terms.pdf'))
+                self.assertIn(b'changed content', server.requests[10].body)
+
+    def test_hashed_once(self):
+        registry = AttachmentRegistry()
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(b'x' * 200000)
+            with self._server() as server:
+                api = server.api(attachment_registry=registry)
+                readers = []
+                hashing_reader = _attachment_registry.HashingReader
+
+                def recording_reader(stream):
+                    readers.append(hashing_reader(stream))
+                    return readers[-1]
+
+                _attachment_registry.HashingReader = recording_reader
+                try:
+                    # hash of in-memory content is known upfront
+                    self._update(api, AA(u'terms.pdf', b'content'))
+                    self.assertEqual(readers, [])
+                    self._update(api, FAA(file_path, name=u'terms.pdf'))
+                finally:
+                    _attachment_registry.HashingReader = hashing_reader
+                # file hashed in chunks while streamed
+                reader, = readers
+                self.assertIsNotNone(reader.hexdigest())
+                self._update(api, FAA(file_path, name=u'terms.pdf'))
+                self.assertNotIn(b'x' * 200000, server.requests[-2].body)
+
+    def test_file_changed_during_upload(self):
+        registry = AttachmentRegistry()
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(b'content')
+            with self._server() as server:
+                api = server.api(attachment_registry=registry)
+                stream = FAA.stream
+
+                class ChangingStream(object):
+                    # the file is appended to once its content was read
+
+                    def __init__(self, f):
+                        self._f = f
+                        self.tell = f.tell
+                        self.seek = f.seek
+                        self.close = f.close
+
+                    def read(self, size=-1):
+                        data = self._f.read(size)
+                        if not data:
+                            with open(file_path, 'ab') as changed:
+                                changed.write(b' changed')
+                        return data
+
+                def changing_stream(attachment):
+                    return ChangingStream(stream(attachment))
+
+                FAA.stream = changing_stream
+                try:
+                    self._update(api, FAA(file_path, name=u'terms.pdf'))
+                finally:
+                    FAA.stream = stream
+                self._update(api, FAA(file_path, name=u'terms.pdf'))
+                self.assertIn(b'content changed', server.requests[-2].body)
+                # the content uploaded first is still known by its hash
+                self._update(api, AA(u'terms.pdf', b'content'))
+                self.assertNotIn(b'content', server.requests[-2].body)
+
+    def test_ambiguous_names(self):
+        registry = AttachmentRegistry()
+        with self._server() as server:
+            api = server.api(attachment_registry=registry)
+            d = api.get_document(u'1234')
+            d.author_attachments.add(AA(u'terms.pdf', b'content'))
+            d.author_attachments.add(AA(u'terms.pdf', b'other content'))
+            api.update_document(d)
+            self.assertEqual(len(registry), 0)
+
+    def test_rejected_reference(self):
+        registry = AttachmentRegistry()
+        with self._server(reject_references=True) as server:
+            api = server.api(attachment_registry=registry)
+            self._update(api, AA(u'terms.pdf', b'content'))
+            self._update(api, AA(u'terms.pdf', b'content'))
+            self.assertEqual(server.endpoints,
+                             ['get', 'setattachments', 'update',
+                              'get', 'setattachments', 'setattachments',
+                              'update'])
+            self.assertIn(b'content', server.requests[5].body)
+            self.assertEqual(len(registry), 1)
+
+
+class ScriveRefreshDocumentTest(utils.TestCase):
+
+    def _get(self, versions, etags=True):
+        def handler(request):
+            version = versions[0]
+            etag = b'"v%d"' % (version,)
+            headers = {'ETag': etag} if etags else {}
+            if etags and request.headers.get('if-none-match') == etag:
+                return 304, headers, b''
+            body = json.dumps(utils.document_json(objectversion=version))
+            return 200, headers, body
+        return handler
+
+    def test_not_modified(self):
+        versions = [1]
+        with utils.StubServer() as server:
+            server.on('get', self._get(versions))
+            api = server.api()
+            d = api.get_document(u'1234')
+            self.assertIs(api.refresh_document(d), d)
+            self.assertEqual(server.requests[-1].headers['if-none-match'],
+                             b'"v1"')
+
+            versions[0] = 2
+            d2 = api.refresh_document(d)
+            self.assertIsNot(d2, d)
+            self.assertEqual(d2.object_version, 2)
+            self.assertIs(api.refresh_document(d2), d2)
+
+    def test_without_etags(self):
+        versions = [1]
+        with utils.StubServer() as server:
+            server.on('get', self._get(versions, etags=False))
+            api = server.api()
+            d = api.get_document(u'1234')
+            self.assertIs(api.refresh_document(d), d)
+            self.assertEqual(server.requests[-1].headers['if-none-match'],
+                             b'"1"')
+
+            versions[0] = 2
+            d2 = api.refresh_document(d)
+            self.assertEqual(d2.object_version, 2)
+
+    def test_invalid_document(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get([1]))
+            api = server.api()
+            d = api.get_document(u'1234')
+            d._set_invalid()
+            d2 = api.refresh_document(d)
+            self.assertIsNot(d2, d)
+            self.assertNotIn('if-none-match', server.requests[-1].headers)
+
+
+class ScriveDocumentCacheTest(utils.TestCase):
+
+    def _get(self, versions):
+        def handler(request):
+            etag = b'"v%d"' % (versions[0],)
+            if request.headers.get('if-none-match') == etag:
+                return 304, {'ETag': etag}, b''
+            body = json.dumps(utils.document_json(objectversion=versions[0]))
+            return 200, {'ETag': etag}, body
+        return handler
+
+    def test_cache_hits(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get([1]))
+            api = server.api(document_cache=DocumentCache())
+            d1 = api.get_document(u'1234')
+            d2 = api.get_document(u'1234')
+            self.assertEqual(len(server.requests), 1)
+
+        self.assertIsNot(d1, d2)
+        self.assertEqual(d2.id, u'1234')
+        with self.assertRaises(ReadOnlyScriveObject):
+            d2.title = u'foo'
+
+    def test_mutable_copies(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get([1]))
+            api = server.api(document_cache=DocumentCache(read_only=False))
+            d1 = api.get_document(u'1234')
+            d1.title = u'changed'
+            d1.signatories.clear()
+            d2 = api.get_document(u'1234')
+        self.assertEqual(d2.title, u'document')
+        self.assertEqual(len(d2.signatories), 1)
+
+    def test_ttl_revalidation(self):
+        versions = [1]
+        with utils.StubServer() as server:
+            server.on('get', self._get(versions))
+            cache = DocumentCache(ttl=.05)
+            api = server.api(document_cache=cache)
+            api.get_document(u'1234')
+            time.sleep(.1)
+            d = api.get_document(u'1234')
+            self.assertEqual(d.object_version, 1)
+            self.assertEqual(server.requests[-1].headers['if-none-match'],
+                             b'"v1"')
+            self.assertTrue(cache.is_fresh(cache.get(u'1234')))
+
+            time.sleep(.1)
+            versions[0] = 2
+            d = api.get_document(u'1234')
+            self.assertEqual(d.object_version, 2)
+            self.assertEqual(len(server.requests), 3)
+
+    def test_invalidation(self):
+        with utils.StubServer() as server:
+            server.on('get', self._get([1]))
+            server.on_document('ready', status=u'Pending')
+            server.on('delete', lambda request: (200, {}, b''))
+            server.on('reallydelete', lambda request: (200, {}, b''))
+            cache = DocumentCache(read_only=False)
+            api = server.api(document_cache=cache)
+
+            d = api.get_document(u'1234')
+            self.assertIsNotNone(cache.get(u'1234'))
+            api.ready(d)
+            self.assertIsNone(cache.get(u'1234'))
+
+            d = api.get_document(u'1234')
+            api.delete_document(d)
+            self.assertIsNone(cache.get(u'1234'))
+
+    def test_disk_cache(self):
+        with utils.temporary_dir() as dir_path:
+            file_path = os.path.join(dir_path, 'cache.db')
+            with utils.StubServer() as server:
+                server.on('get', self._get([1]))
+                api = server.api(document_cache=DiskDocumentCache(file_path))
+                api.get_document(u'1234')
+
+                # restarted worker
+                api = server.api(document_cache=DiskDocumentCache(file_path))
+                d = api.get_document(u'1234')
+                self.assertEqual(d.id, u'1234')
+                self.assertEqual(len(server.requests), 1)
+
+                api = server.api(
+                    document_cache=DiskDocumentCache(file_path, ttl=0))
+                d = api.get_document(u'1234')
+                self.assertEqual(d.object_version, 1)
+                self.assertEqual(server.requests[-1].headers['if-none-match'],
+                                 b'"v1"')
+
+
+class ScriveCoalescingTest(utils.TestCase):
+
+    def _run_concurrently(self, fun, count=5):
+        results = [None] * count
+
+        def run(i):
+            results[i] = fun()
+
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _slow(self, body):
+        def handler(request):
+            time.sleep(.3)
+            return 200, {}, body
+        return handler
+
+    def test_get_document(self):
+        infos = []
+        with utils.StubServer() as server:
+            server.on('get', self._slow(json.dumps(utils.document_json())))
+            api = server.api(hooks={u'after_response': [infos.append]})
+            docs = self._run_concurrently(
+                lambda: api.get_document(u'1234'))
+            self.assertEqual(len(server.requests), 1)
+
+        self.assertEqual(len(set(id(d) for d in docs)), 5)
+        self.assertTrue(all(d.id == u'1234' for d in docs))
+        docs[0].title = u'changed'
+        self.assertEqual(docs[1].title, u'document')
+        self.assertEqual(sorted(info.coalesced for info in infos),
+                         [False, True, True, True, True])
+
+    def test_downloadfile(self):
+        with utils.StubServer() as server:
+            server.on_document('get')
+            server.on('downloadfile', self._slow(b'pdf'))
+            api = server.api()
+            d = api.get_document(u'1234')
+            results = self._run_concurrently(d.original_file.get_bytes)
+            self.assertEqual(len(server.requests), 2)
+        self.assertEqual(results, [b'pdf'] * 5)
+
+    def test_disabled(self):
+        with utils.StubServer() as server:
+            server.on('get', self._slow(json.dumps(utils.document_json())))
+            api = server.api(coalesce_requests=False)
+            self._run_concurrently(lambda: api.get_document(u'1234'))
+            self.assertEqual(len(server.requests), 5)
+
+    def test_read_your_writes(self):
+        with utils.StubServer() as server:
+            version = [1]
+            requested = threading.Event()
+
+            def get(request):
+                body = json.dumps(utils.document_json(
+                    objectversion=version[0]))
+                requested.set()
+                time.sleep(.5)
+                return 200, {}, body
+
+            def update(request):
+                version[0] = 2
+                return 200, {}, json.dumps(utils.document_json(
+                    objectversion=2))
+            server.on('get', get)
+            server.on('update', update)
+            api = server.api()
+            d = api.get_document(u'1234')
+            requested.clear()
+
+            # another thread's read is in flight during the update
+            reader = threading.Thread(target=api.get_document,
+                                      args=(u'1234',))
+            reader.start()
+            self.assertTrue(requested.wait(5))
+            d.title = u'changed'
+            self.assertEqual(api.update_document(d).object_version, 2)
+            self.assertEqual(api.get_document(u'1234').object_version, 2)
+            reader.join()
+            self.assertEqual(len(server.requests), 4)
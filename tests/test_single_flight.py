@@ -0,0 +1,81 @@
+import threading
+import time
+
+from scrivepy import _single_flight
+from tests import utils
+
+
+class SingleFlightTest(utils.TestCase):
+
+    def _run_concurrently(self, fun, count=5):
+        results = [None] * count
+
+        def run(i):
+            try:
+                results[i] = fun()
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_shared_result(self):
+        sf = _single_flight.SingleFlight()
+        calls = []
+
+        def fun():
+            calls.append(None)
+            time.sleep(.2)
+            return object()
+
+        results = self._run_concurrently(lambda: sf.do(u'key', fun))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(id(result) for result, _ in results)), 1)
+        self.assertEqual(sorted(shared for _, shared in results),
+                         [False, True, True, True, True])
+
+        # finished calls aren't reused
+        result, shared = sf.do(u'key', fun)
+        self.assertFalse(shared)
+        self.assertEqual(len(calls), 2)
+
+    def test_shared_exception(self):
+        sf = _single_flight.SingleFlight()
+
+        def fun():
+            time.sleep(.2)
+            raise ValueError(u'boom')
+
+        results = self._run_concurrently(lambda: sf.do(u'key', fun))
+        self.assertTrue(all(isinstance(result, ValueError)
+                            for result in results))
+
+    def test_different_keys(self):
+        sf = _single_flight.SingleFlight()
+        self.assertEqual(sf.do(u'a', lambda: 1), (1, False))
+        self.assertEqual(sf.do(u'b', lambda: 2), (2, False))
+
+    def test_forget(self):
+        sf = _single_flight.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 1
+
+        thread = threading.Thread(target=sf.do, args=(u'key', slow))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        sf.forget(lambda key: key == u'key')
+        # not joined, but started anew
+        self.assertEqual(sf.do(u'key', lambda: 2), (2, False))
+        release.set()
+        thread.join()
+        self.assertEqual(sf._calls, {})
@@ -0,0 +1,102 @@
+import cStringIO
+
+from scrivepy import Error, _upload
+from tests import utils
+
+
+MultipartBody = _upload.MultipartBody
+
+
+def _body(file_name, source, **kwargs):
+    return MultipartBody([('file', file_name, source, 'application/pdf')],
+                         **kwargs)
+
+
+class MultipartBodyTest(utils.TestCase):
+
+    def _parts(self, body):
+        content = body.read()
+        boundary = body.content_type.split(b'boundary=')[1]
+        head, rest = content.split(b'\r\n\r\n', 1)
+        self.assertTrue(head.startswith(b'--' + boundary + b'\r\n'))
+        self.assertTrue(rest.endswith(b'\r\n--' + boundary + b'--\r\n'))
+        return head, rest[:-len(boundary) - 8]
+
+    def test_file_path(self):
+        with utils.temporary_file_path() as file_path:
+            with open(file_path, 'wb') as f:
+                f.write(b'x' * 100000)
+            body = _body(u'document.pdf', file_path, chunk_size=1000)
+            self.assertEqual(len(body.read(1000)), 1000)
+            self.assertIsNotNone(body._sources[0]._file)
+            body.rewind()
+            head, content = self._parts(body)
+        self.assertIn(b'name="file"; filename="document.pdf"', head)
+        self.assertIn(b'Content-Type: application/pdf', head)
+        self.assertEqual(content, b'x' * 100000)
+        self.assertEqual(body.len, len(head) + 100000 + 4 + 32 + 8)
+        # closed once read to the end
+        self.assertIsNone(body._sources[0]._file)
+
+    def test_file_obj(self):
+        f = cStringIO.StringIO(b'skipped' + b'y' * 5000)
+        f.read(7)
+        body = _body(u'a.pdf', f, chunk_size=1000)
+        length = body.len
+        head, content = self._parts(body)
+        self.assertEqual(content, b'y' * 5000)
+        self.assertEqual(length, len(head) + 5000 + 4 + 32 + 8)
+        body.rewind()
+        self.assertEqual(self._parts(body)[1], b'y' * 5000)
+
+    def test_iterable(self):
+        body = _body(u'a.pdf', iter([b'ab', b'', b'cde']))
+        self.assertFalse(hasattr(body, 'len'))
+        chunks = list(_body(u'a.pdf', [b'z' * 10], chunk_size=4))
+        self.assertTrue(all(len(chunk) <= 4 for chunk in chunks))
+        self.assertIn(b'z' * 10, b''.join(chunks))
+        self.assertEqual(self._parts(body)[1], b'abcde')
+        with self.assertRaises(Error, u"Can't resend upload from an iterable"):
+            body.rewind()
+
+    def test_non_ascii_file_name(self):
+        body = _body(u'\u017c\xf3\u0142w.pdf', [b''])
+        self.assertIn(b"filename*=utf-8''%C5%BC%C3%B3%C5%82w.pdf",
+                      self._parts(body)[0])
+
+    def test_progress(self):
+        calls = []
+        body = _body(u'a.pdf', cStringIO.StringIO(b'x' * 2500),
+                     progress=lambda *args: calls.append(args),
+                     chunk_size=1000)
+        total = body.len
+        for _ in body:
+            pass
+        self.assertEqual([sent for sent, _, _ in calls],
+                         [1000, 2000, total])
+        self.assertTrue(all(t == total for _, t, _ in calls))
+        self.assertTrue(all(elapsed >= 0 for _, _, elapsed in calls))
+
+    def test_several_parts(self):
+        f = cStringIO.StringIO(b'y' * 5000)
+        body = MultipartBody([('a', u'a.pdf', f, 'application/pdf'),
+                              ('b', u'b.txt', [b'text'], 'text/plain')],
+                             data=[('id', u'1'), ('name', u'\xe5')],
+                             chunk_size=1000)
+        self.assertFalse(hasattr(body, 'len'))
+        content = body.read()
+        boundary = body.content_type.split(b'boundary=')[1]
+        parts = content.split(b'--' + boundary)
+        self.assertEqual(parts[0], b'')
+        self.assertEqual(parts[-1], b'--\r\n')
+        self.assertEqual(
+            [part.split(b'\r\n\r\n', 1)[1] for part in parts[1:-1]],
+            [b'1\r\n', u'\xe5\r\n'.encode('utf-8'),
+             b'y' * 5000 + b'\r\n', b'text\r\n'])
+        self.assertIn(b'name="b"; filename="b.txt"\r\n'
+                      b'Content-Type: text/plain', parts[4])
+
+        f.seek(0)
+        body = MultipartBody([('a', u'a.pdf', f, 'application/pdf')],
+                             data=[('id', u'1')])
+        self.assertEqual(body.len, len(body.read()))
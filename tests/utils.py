@@ -1,4 +1,7 @@
 import contextlib
+import json
+import threading
+import urlparse
 from subprocess import check_output
 import os
 import re
@@ -11,7 +14,9 @@ from os import path
 import nose
 import testconfig
 
-from scrivepy import InvalidScriveObject, ReadOnlyScriveObject, Scrive
+from scrivepy import FakeScriveServer, InvalidScriveObject, \
+    ReadOnlyScriveObject, Scrive
+from scrivepy import _fake
 
 
 class AssertRaisesContext(object):
@@ -196,23 +201,39 @@ class TestCase(unittest.TestCase):
 
 
 class IntegrationTestCase(TestCase):
+    '''
+    Tests of the server configured in tests/test_config.json or, if
+    SCRIVEPY_FAKE_SERVER is set in the environment, of a FakeScriveServer
+    started for the test case.
+    '''
 
     @classmethod
     def setUpClass(class_):
-        try:
-            cfg = testconfig.config['test_api_server']
-        except KeyError:
-            print 'You need to set api server configuration in'
-            print 'tests/test_config.json (see tests/test_config_example.json)'
+        class_.fake_server = None
+        if os.environ.get('SCRIVEPY_FAKE_SERVER'):
+            class_.fake_server = FakeScriveServer()
+            class_.api = class_.fake_server.api()
         else:
+            try:
+                cfg = testconfig.config['test_api_server']
+            except KeyError:
+                print 'You need to set api server configuration in'
+                print ('tests/test_config.json '
+                       '(see tests/test_config_example.json)')
+                return
             class_.api = Scrive(**cfg)
-            docs_path = path.dirname(path.abspath(__file__))
-            class_.test_doc_path = path.join(docs_path, 'document.pdf')
-            with open(class_.test_doc_path, 'rb') as f:
-                class_.test_doc_contents = f.read()
-            class_.test_doc_path2 = path.join(docs_path, 'document2.pdf')
-            with open(class_.test_doc_path2, 'rb') as f:
-                class_.test_doc_contents2 = f.read()
+        docs_path = path.dirname(path.abspath(__file__))
+        class_.test_doc_path = path.join(docs_path, 'document.pdf')
+        with open(class_.test_doc_path, 'rb') as f:
+            class_.test_doc_contents = f.read()
+        class_.test_doc_path2 = path.join(docs_path, 'document2.pdf')
+        with open(class_.test_doc_path2, 'rb') as f:
+            class_.test_doc_contents2 = f.read()
+
+    @classmethod
+    def tearDownClass(class_):
+        if class_.fake_server is not None:
+            class_.fake_server.close()
 
     @contextlib.contextmanager
     def new_document_from_file(self):
@@ -261,3 +282,149 @@ def temporary_dir():
             shutil.rmtree(dir_path)
         except OSError:
             pass
+
+
+def signatory_json(**kwargs):
+    result = _fake._signatory_json(id=u'1',
+                                   current=True,
+                                   delivery=u'api',
+                                   confirmationdelivery=u'none',
+                                   author=True,
+                                   saved=True)
+    result.update(kwargs)
+    return result
+
+
+def document_json(**kwargs):
+    result = _fake._document_json(id=u'1234',
+                                  title=u'document',
+                                  time=u'2016-06-01T12:00:00Z',
+                                  ctime=u'2016-06-01T12:00:00Z',
+                                  lang=u'en',
+                                  saved=True,
+                                  accesstoken=u'1234567890abcdef',
+                                  file={u'id': u'5678',
+                                        u'name': u'document.pdf'},
+                                  signatories=[signatory_json()])
+    result.update(kwargs)
+    return result
+
+
+def attachment_json(**kwargs):
+    result = {u'id': u'1',
+              u'name': u'a.pdf',
+              u'required': False,
+              u'add_to_sealed_file': True}
+    result.update(kwargs)
+    return result
+
+
+class StubRequest(object):
+
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.headers = headers
+        self.body = body
+        url = urlparse.urlparse(path)
+        self.path = url.path
+        self.query = dict(urlparse.parse_qsl(url.query))
+        elems = url.path.split('/api/v1/', 1)[-1].split('/')
+        self.endpoint = elems[0]
+        self.args = elems[1:]
+
+
+class _StubHandler(_fake._RequestHandler):
+
+    def _handle(self):
+        request = StubRequest(self.command, self.path,
+                              dict(self.headers.items()), self._read_body())
+        stub = self.server.stub
+        with stub._lock:
+            stub.requests.append(request)
+        status, headers, body = stub._respond(request)
+        self.send_response(status)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        if 'Content-Length' in headers:
+            # longer than body, simulates connection dropped mid-response
+            self.close_connection = 1
+        else:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+
+class StubServer(object):
+    '''
+    Local stand-in for the Scrive API, for tests that don't need
+    a real server. Handlers are registered per endpoint and return
+    (status, headers, body) tuples.
+    '''
+
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+        self._handlers = {}
+        self._server = _fake._ThreadingHTTPServer(('127.0.0.1', 0),
+                                                  _StubHandler)
+        self._server.stub = self
+
+    @property
+    def connections(self):
+        with self._server.lock:
+            return len(self._server.connections)
+
+    @property
+    def endpoints(self):
+        return [request.endpoint for request in self.requests]
+
+    @property
+    def api_hostname(self):
+        return b'127.0.0.1:%d' % (self._server.server_address[1],)
+
+    def on(self, endpoint, handler):
+        self._handlers[endpoint] = handler
+
+    def on_document(self, endpoint, **kwargs):
+        body = json.dumps(document_json(**kwargs))
+        self.on(endpoint, lambda request: (200, {}, body))
+
+    def _respond(self, request):
+        handler = self._handlers.get(request.endpoint)
+        if handler is None:
+            return 404, {}, b''
+        return handler(request)
+
+    def api(self, api_class=Scrive, **kwargs):
+        return api_class(client_credentials_identifier=b'1',
+                         client_credentials_secret=b'2',
+                         token_credentials_identifier=b'3',
+                         token_credentials_secret=b'4',
+                         api_hostname=self.api_hostname,
+                         https=False, **kwargs)
+
+    def __enter__(self):
+        self._server.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._server.close()
+
+
+def document_server(attachments=(), set_attachments=None):
+    '''
+    StubServer for preparing and sending documents. All documents it
+    returns have attachments, set_attachments replaces the handler of
+    setattachments.
+    '''
+    server = StubServer()
+    attachments = list(attachments)
+    for endpoint in ('get', 'createfromfile', 'createfromtemplate',
+                     'update', 'setattachments'):
+        server.on_document(endpoint, authorattachments=attachments)
+    server.on_document('ready', status=u'Pending',
+                       authorattachments=attachments)
+    if set_attachments is not None:
+        server.on('setattachments', set_attachments)
+    return server